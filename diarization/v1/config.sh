@@ -34,6 +34,23 @@ LABEL_DIR=${ULTRASUITE}/labels-uxtd-uxssd-upx
 DATA_DIR=./data/tmp
 EXP_DIR=./exp/tmp
 
+# corpus manifests, shared across experiments
+# built once per corpus and updated for new or modified files
+MANIFEST_DIR=./data/manifest
+
+# ETA cache, shared across experiments
+# ETA is only recomputed if ultrasound or ETA settings change
+ETA_CACHE=./data/eta_cache
+
+# alignment score cache, shared across experiments
+# utterances are only rescored if their labels or scoring settings change
+SCORE_CACHE=./exp/score_cache
+
+# LM weights and word insertion penalties swept in Stage 4
+min_lmwt=7
+max_lmwt=17
+word_ins_penalty="0.0 0.5 1.0"
+
 # config for acoustic feature extraction
 mfcc_conf=conf/mfcc.conf
 pitch_conf=conf/pitch.conf
@@ -15,38 +15,12 @@ import fileinput
 import logging
 import argparse
 
+import labels
+
 
 def convert_ctm(ctm_data, lab_filename, table=None):
     ''' convert ctm to lab for single utterance '''
-    output = open(lab_filename, 'w')
-
-    for item in ctm_data:
-        start, dur, phone = item
-        start = float(start)
-        end   = start + float(dur)
-
-        # convert to HTK-seconds
-        start *= 10000000.
-        end   *= 10000000.
-
-        if table:
-            phone = table[int(phone)]
-            if '_' in phone:
-                phone = phone.split('_')
-                phone = phone[0]
-
-        line = ' '.join((str(int(start)), str(int(end)), phone))
-        output.write(line + '\n')
-    output.close()
-
-
-def read_phones(filename):
-    ''' read phone conversion table from file '''
-    table = {}
-    for line in fileinput.input(filename):
-        phn, pid = line.split()
-        table[int(pid)] = phn
-    return table
+    labels.write_lab(labels.ctm_to_lab(ctm_data, table), lab_filename)
 
 
 def main(ctm_fname, out_directory, lang_dir):
@@ -70,7 +44,7 @@ def main(ctm_fname, out_directory, lang_dir):
     if lang_dir:
         phone_f = os.path.join(lang_dir, 'phones.txt')
         if os.path.isfile(phone_f):
-            phone_table = read_phones(phone_f)
+            phone_table = labels.read_phones(phone_f)
         else:
             logging.warning('Phone table not found in lang directory. Not converting phones.')
 
@@ -86,7 +60,7 @@ def main(ctm_fname, out_directory, lang_dir):
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument('-ctm', required=True, type=str,  help='ctm file to convert')
+    parser.add_argument('-ctm', required=True, type=str,  help='ctm file to convert (- for stdin)')
     parser.add_argument('-labdir', required=True, type=str,  help='output directory for lab files')
     parser.add_argument('-langdir', required=False, default=None,  help='Kaldi lang directory for phone conversion')
     args = parser.parse_args()
@@ -1,42 +1,79 @@
 #!/bin/bash
 
 # Converts decoder alignment to labels and TextGrids
-# Usage: decode-to-labs.sh <MODDIR> <DECODEDIR> <GRAPHDIR>
+# Usage: decode-to-labs.sh [options] <MODDIR> <DECODEDIR> <GRAPHDIR> <DATADIR>
+# e.g.: decode-to-labs.sh --cmd "$decode_cmd" exp/mono0a exp/mono0a/decode_test exp/mono0a/graph data/test
+#
+# Options:
+#   --cmd <cmd>                 # how to run jobs (run.pl, queue.pl, ...), as in cmd.sh
+#   --max-jobs-run <n>          # maximum number of jobs run at once (default: all)
+#   --lmwt <lmwt>               # language model weight for 1-best path (default: 12)
+#   --wip <wip>                 # word insertion penalty for 1-best path (default: 0.0)
+#   --textgrids <true|false>    # write TextGrids to DECODEDIR/TG, requires praatio (default: true)
+#   --keep-lab-pre <true|false> # keep labels before correction in DECODEDIR/lab_pre (default: false)
+#
+# Unless given as options, the LM weight and word insertion penalty are read
+# from DECODEDIR/lmwt and DECODEDIR/wip, if tuned by sweep-lmwt.sh.
+#
+# Lattices are converted to labels with one job per lattice archive
+# (lat.JOB.gz, as written by steps/decode.sh). Each job streams its CTM
+# directly into labels.py, which writes corrected labels to DECODEDIR/lab
+# and TextGrids to DECODEDIR/TG.
+
+# begin configuration section
+cmd=run.pl
+max_jobs_run=
+
+lmwt=
+wip=
+textgrids=true
+keep_lab_pre=false
+# end configuration section
+
+echo "$0 $@"  # Print the command line for logging
+
+[ -f ./path.sh ] && . ./path.sh
+. utils/parse_options.sh || exit 1;
+
+if [ $# -ne 4 ]; then
+    echo "Usage: $0 [options] <MODDIR> <DECODEDIR> <GRAPHDIR> <DATADIR>"
+    exit 1;
+fi
 
 MODDIR=$1       # model directory, e.g. './exp/mono0a'
 DECODEDIR=$2    # decoding directory, e.g. './exp/mono0a/decode_test'
 GRAPHDIR=$3     # graph directory, e.g. './exp/mono0a/graph'
 DATADIR=$4      # data directory with utt2dur
 
-# we use this here by default, although
-# we should get it from the decoding dir
-lmwt=12
+# tuned settings from the decoding directory, if available
+[ -z "$lmwt" ] && [ -f ${DECODEDIR}/lmwt ] && lmwt=$(cat ${DECODEDIR}/lmwt)
+[ -z "$wip" ] && [ -f ${DECODEDIR}/wip ] && wip=$(cat ${DECODEDIR}/wip)
+lmwt=${lmwt:-12}
+wip=${wip:-0.0}
+echo "$0: converting 1-best path with lmwt=${lmwt} wip=${wip}"
+
+# one job per lattice archive
+if [ -f ${DECODEDIR}/num_jobs ]; then
+    nj=$(cat ${DECODEDIR}/num_jobs)
+else
+    nj=$(ls ${DECODEDIR}/lat.*.gz | wc -l)
+fi
 
-# convert lattice to ctm
-for LAT in ${DECODEDIR}/lat.*.gz; do
-    lattice-1best --lm-scale=${lmwt} "ark:zcat ${LAT} |" ark:- | \
-        lattice-align-words-lexicon ${GRAPHDIR}/phones/align_lexicon.int ${MODDIR}/final.mdl ark:- ark:- | \
-        nbest-to-ctm ark:- - |
-        ./utils/int2sym.pl -f 5 ${GRAPHDIR}/words.txt > ${LAT%.gz}.ctm
+# labels are rewritten from scratch
+for dir in lab_pre lab TG; do
+    [ -d ${DECODEDIR}/$dir ] && rm -r ${DECODEDIR}/$dir
 done
+mkdir -p ${DECODEDIR}/lab ${DECODEDIR}/log
+
+opts=
+$textgrids && opts="$opts --tgdir ${DECODEDIR}/TG --dur ${DATADIR}/utt2dur" && mkdir -p ${DECODEDIR}/TG
+$keep_lab_pre && opts="$opts --lab-pre-dir ${DECODEDIR}/lab_pre" && mkdir -p ${DECODEDIR}/lab_pre
 
-[ -e ${DECODEDIR}/lat.ctm ] && rm ${DECODEDIR}/lat.ctm
-cat ${DECODEDIR}/*.ctm > ${DECODEDIR}/lat.ctm
-
-# convert CTM to HTK lab
-python ./local/align/ctm-to-lab.py \
-    -ctm ${DECODEDIR}/lat.ctm \
-    -labdir ${DECODEDIR}/lab_pre
-
-# fix short segments and silences
-python ./local/align/merge-short-segments.py \
-  --indir ${DECODEDIR}/lab_pre \
-  --outdir ${DECODEDIR}/lab
-
-# convert labs to TextGrid
-# this step requires praatio
-# comment this out if you do not need TextGrids
-python ./local/align/lab2tg.py \
-  --labdir ${DECODEDIR}/lab \
-  --tgdir ${DECODEDIR}/TG \
-  --dur ${DATADIR}/utt2dur
+# convert lattice to ctm, and ctm to corrected HTK lab and TextGrid
+$cmd ${max_jobs_run:+--max-jobs-run $max_jobs_run} JOB=1:$nj ${DECODEDIR}/log/lat_to_lab.JOB.log \
+    lattice-add-penalty --word-ins-penalty=${wip} "ark:gunzip -c ${DECODEDIR}/lat.JOB.gz |" ark:- \| \
+    lattice-1best --lm-scale=${lmwt} ark:- ark:- \| \
+    lattice-align-words-lexicon ${GRAPHDIR}/phones/align_lexicon.int ${MODDIR}/final.mdl ark:- ark:- \| \
+    nbest-to-ctm ark:- - \| \
+    ./utils/int2sym.pl -f 5 ${GRAPHDIR}/words.txt \| \
+    python ./local/align/labels.py --ctm - --labdir ${DECODEDIR}/lab $opts || exit 1;
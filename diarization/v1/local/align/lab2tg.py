@@ -9,31 +9,18 @@ Author: M. Sam Ribeiro
 
 import os
 import argparse
-from praatio import tgio
 
-def lab2tg(input_filename, output_filename, wav_duration, tiername=None):
+import labels
 
-    lab = []
+def lab2tg(input_filename, output_filename, wav_duration, tiername=None):
 
-    with open(input_filename, 'r') as fid:
-        for line in fid.readlines():
-            start, end, label = line.rstrip().split()
-            start = float(start)/10000000.
-            end   = float(end)/10000000.
-            lab.append((start, end, label))
+    lab = labels.read_lab(input_filename)
 
     if len(lab) <= 0:
         print('Unable to convert empty lab for {0}'.format(input_filename))
         return
 
-    if not tiername:
-        tiername = 'tier_1'
-
-    tg = tgio.Textgrid()
-    tier = tgio.IntervalTier(tiername, lab, 0, wav_duration)
-
-    tg.addTier(tier)
-    tg.save(output_filename)
+    labels.write_textgrid(lab, output_filename, wav_duration, tiername)
 
 
 
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Convert Kaldi ctm alignment to labels and TextGrids in a single pass.
+
+Equivalent to running ctm-to-lab.py, merge-short-segments.py and lab2tg.py
+in sequence, without intermediate lab_pre and lab directories being re-read.
+The ctm is read as a stream (a file, or - for stdin) and each utterance is
+processed as soon as all of its lines are read, so it must be grouped by
+utterance, as written by nbest-to-ctm. Per utterance:
+
+    1) ctm lines are converted to HTK labels (see ctm-to-lab.py)
+    2) short silences are merged and short labels removed (see merge-short-segments.py)
+    3) labels are written to labdir and, optionally, to TextGrids in tgdir
+
+Labels before step 2 are only written with --lab-pre-dir.
+
+Date: 2026
+"""
+
+import os, sys
+import fileinput
+import argparse
+import itertools
+
+
+MAX_SIL = 0.2   # merge labels if silence between them is shorter than this (secs)
+MIN_LEN = 0.1   # remove labels if they are shorter than this (secs)
+
+# these functions convert seconds to HTK-seconds
+to_htkseconds = lambda x : int(float(x)*10000000.)
+to_seconds    = lambda x : float(int(x)/10000000.)
+
+
+def read_ctm(ctm_fname):
+    ''' iterate over utterances in a ctm file grouped by utterance
+        yields tuples of (utterance, list of (start, dur, phone))
+        raises ValueError if an utterance is found in two groups
+    '''
+    seen = set()
+    lines = (line.split() for line in fileinput.input(ctm_fname))
+
+    for utt, items in itertools.groupby(lines, key=lambda item: item[0]):
+        if utt in seen:
+            raise ValueError('ctm is not grouped by utterance, {0} found twice'.format(utt))
+        seen.add(utt)
+        yield utt, [(start, dur, phone) for _, channel, start, dur, phone in items]
+
+
+def read_phones(filename):
+    ''' read phone conversion table from file '''
+    table = {}
+    with open(filename, 'r') as fid:
+        for line in fid:
+            phn, pid = line.split()
+            table[int(pid)] = phn
+    return table
+
+
+def ctm_to_lab(ctm_data, table=None):
+    ''' convert ctm to lab for single utterance
+        returns list of (start, end, label), in HTK-seconds
+    '''
+    lab = []
+    for start, dur, phone in ctm_data:
+        start = float(start)
+        end   = start + float(dur)
+
+        if table:
+            phone = table[int(phone)]
+            if '_' in phone:
+                phone = phone.split('_')
+                phone = phone[0]
+
+        lab.append((int(start * 10000000.), int(end * 10000000.), phone))
+    return lab
+
+
+def merge_short_segments(lab):
+    ''' merge labels separated by short silences and remove short labels
+        lab: list of (start, end, label), in HTK-seconds
+        returns corrected list of (start, end, label), in HTK-seconds
+    '''
+    data = []
+    previous = (0.0, 0.0, None)
+
+    # first pass handles short silences
+    for start, end, label in lab:
+        start = to_seconds(start)
+        end = to_seconds(end)
+
+        pstart, pend, plabel = previous
+        item = (start, end, label)
+
+        append = True
+        if (start - pend) <= MAX_SIL:
+            if not plabel:
+                item = (pstart, end, label)
+
+            elif label == plabel:
+                item = (pstart, end, label)
+                data[-1] = item
+                append = False
+
+        if append: data.append(item)
+        previous = item
+
+    # second pass to remove very short segments
+    data = [(s, e, l) for s,e,l in data if (e-s)>= MIN_LEN]
+
+    return [(to_htkseconds(s), to_htkseconds(e), l) for s, e, l in data]
+
+
+def read_lab(filename):
+    ''' read HTK label into a list of (start, end, label), in HTK-seconds '''
+    lab = []
+    with open(filename, 'r') as fid:
+        for line in fid.readlines():
+            start, end, label = line.rstrip().split()
+            lab.append((int(start), int(end), label))
+    return lab
+
+
+def write_lab(lab, filename):
+    ''' write list of (start, end, label) to HTK label '''
+    with open(filename, 'w') as fid:
+        for start, end, label in lab:
+            fid.write(' '.join((str(start), str(end), label)) + '\n')
+
+
+def write_textgrid(lab, filename, wav_duration, tiername=None):
+    ''' write list of (start, end, label) to a single tier TextGrid '''
+    # this step requires praatio, only imported if TextGrids are written
+    from praatio import tgio
+
+    if not tiername:
+        tiername = 'tier_1'
+
+    lab = [(start/10000000., end/10000000., label) for start, end, label in lab]
+
+    tg = tgio.Textgrid()
+    tier = tgio.IntervalTier(tiername, lab, 0, wav_duration)
+
+    tg.addTier(tier)
+    tg.save(filename)
+
+
+def read_utt2dur(filename):
+    utt2dur = {}
+    with open(filename, 'r') as fid:
+        for line in fid.readlines():
+            utt, dur = line.rstrip().split()
+            utt2dur[utt] = float(dur)
+    return utt2dur
+
+
+def main(ctm_fname, labdir, tgdir=None, dur_f=None, lang_dir=None, lab_pre_dir=None):
+
+    if tgdir and not dur_f:
+        print('utt2dur is required to write TextGrids')
+        sys.exit(1)
+
+    # read phone table, if available
+    phone_table = None
+    if lang_dir:
+        phone_f = os.path.join(lang_dir, 'phones.txt')
+        if os.path.isfile(phone_f):
+            phone_table = read_phones(phone_f)
+        else:
+            print('Warning: phone table not found in lang directory. Not converting phones.')
+
+    utt2dur = {}
+    if tgdir:
+        utt2dur = read_utt2dur(dur_f)
+
+    for directory in [labdir, tgdir, lab_pre_dir]:
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+    num_utterances = 0
+    utterances = read_ctm(ctm_fname)
+    while True:
+        try:
+            utt, ctm_data = next(utterances)
+        except StopIteration:
+            break
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
+
+        num_utterances += 1
+
+        lab = ctm_to_lab(ctm_data, phone_table)
+        if lab_pre_dir:
+            write_lab(lab, os.path.join(lab_pre_dir, utt+'.lab'))
+
+        # write to output file (even if empty)
+        lab = merge_short_segments(lab)
+        write_lab(lab, os.path.join(labdir, utt+'.lab'))
+
+        if len(lab) <= 0:
+            print('labels.py - empty label after correction {0}'.format(utt))
+            continue
+
+        if tgdir:
+            write_textgrid(lab, os.path.join(tgdir, utt+'.TextGrid'), utt2dur[utt])
+
+    print('labels.py: converted {0} utterances'.format(num_utterances))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ctm', dest='ctm', type=str, required=True, help='ctm file to convert (- for stdin)')
+    parser.add_argument('--labdir', dest='labdir', type=str, required=True, help='output directory for lab files')
+    parser.add_argument('--tgdir', dest='tgdir', type=str, help='output directory for TextGrid files')
+    parser.add_argument('--dur', dest='dur', type=str, help='utt2dur filename, required for TextGrids')
+    parser.add_argument('--langdir', dest='langdir', type=str, help='Kaldi lang directory for phone conversion')
+    parser.add_argument('--lab-pre-dir', dest='lab_pre_dir', type=str, help='output directory for labels before correction')
+    parser.set_defaults(tgdir=None)
+    parser.set_defaults(dur=None)
+    parser.set_defaults(langdir=None)
+    parser.set_defaults(lab_pre_dir=None)
+    args = parser.parse_args()
+
+    main(args.ctm, args.labdir, args.tgdir, args.dur, args.langdir, args.lab_pre_dir)
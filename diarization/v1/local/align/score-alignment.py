@@ -14,19 +14,45 @@ score.seconds
 report.seconds
     table with primary metrics at the utterance-level, sorted by DER.
 
+With --nj, utterances are scored by parallel worker processes. Per-utterance
+metric components are merged in file order, so outputs are identical to
+scoring serially.
+
+With --backend numpy, utterances are scored on a frame grid of --resolution
+seconds (see frame_scoring.py) instead of with pyannote annotations, and
+--check n compares both backends on a sample of n utterances.
+
+Several hypothesis directories (--hyp) and collars (--collar) can be scored
+in one run, reading each label file once. Outputs are then written to
+out/SYSTEM/collar_C/, with a table of global scores in out/comparison.seconds.
+A single hypothesis directory and collar is written to out/ as before.
+
+With --cache-dir, per-utterance scores are cached by content of the label
+files and scoring configuration (see score_cache.py), and only utterances
+with changed labels are rescored.
+
 
 Date: 2018
 Author: M. Sam Ribeiro
 """
 
 import os, sys
+import random
 import argparse
 
+from multiprocessing import Pool
+
 from pyannote.core import Annotation, Segment
 from pyannote.metrics.identification import IdentificationErrorRate,\
     IdentificationPrecision, IdentificationRecall
 from pyannote.metrics.diarization import DiarizationErrorRate
 
+import frame_scoring
+from score_cache import ScoreCache
+
+
+SKIP_TOKENS = ['OVERLAP', 'SPN']
+SKIP_TOKENS_CHILD = ['OVERLAP', 'SPN', 'SLT']
 
 
 def read_annotation(filename, annotation_type=None, skip_tokens=[]):
@@ -49,90 +75,269 @@ def read_annotation(filename, annotation_type=None, skip_tokens=[]):
 
 
 
-def main(reference_dir, hypothesis_dir, output_dir):
+def create_metrics(collar=0.1):
+    ''' DER, IER, precision and recall metrics '''
+    der_eval  = DiarizationErrorRate(collar=collar)
+    ier_eval  = IdentificationErrorRate(collar=collar)
+    prec_eval = IdentificationPrecision(collar=collar)
+    rec_eval  = IdentificationRecall(collar=collar)
+    return der_eval, ier_eval, prec_eval, rec_eval
+
+
+def merge_metric(metric, results):
+    ''' accumulate per-utterance components computed by another metric instance,
+        in the same order as calling the metric on each utterance
+    '''
+    for uri, components in results:
+        metric.results_.append((uri, components))
+        for name in metric.components_:
+            metric.accumulated_[name] += components[name]
+
+
+def record(metric, components, uri=None):
+    ''' add metric value to components computed outside of the metric,
+        and accumulate them as if calling the metric
+    '''
+    components[metric.metric_name_] = metric.compute_metric(components)
+    merge_metric(metric, [(uri, components)])
+    return components
+
+
+def read_labels(filename, annotation_type=None, backend='pyannote'):
+    ''' read HTK label with and without SLT, as pyannote Annotations,
+        or as segment lists for the numpy backend (see frame_scoring.py)
+        returns tuple of (labels, child labels)
+    '''
+    if backend == 'numpy':
+        return frame_scoring.read_segments(filename, skip_tokens=SKIP_TOKENS), \
+            frame_scoring.read_segments(filename, skip_tokens=SKIP_TOKENS_CHILD)
+
+    return read_annotation(filename, annotation_type=annotation_type, skip_tokens=SKIP_TOKENS), \
+        read_annotation(filename, annotation_type=annotation_type, skip_tokens=SKIP_TOKENS_CHILD)
+
+
+def label_sequence(labels, backend='pyannote'):
+    ''' labels in order of segments '''
+    if backend == 'numpy':
+        return [label for _, _, label in labels]
+    return [label for _, _, label in labels.itertracks(yield_label=True)]
+
+
+def label_seconds(labels, backend='pyannote'):
+    ''' total duration of segments '''
+    if backend == 'numpy':
+        return sum([end - start for start, end, _ in labels])
+    return sum([i.end-i.start for i in labels.itersegments()])
+
+
+def score_annotations(reference, hypothesis, metrics):
+    ''' score a single utterance with pyannote metrics
+        reference, hypothesis: tuples of annotations with and without SLT
+        returns dict with components for der, ier, precision and recall
+    '''
+    der_eval, ier_eval, prec_eval, rec_eval = metrics
+    reference, reference_child = reference
+    hypothesis, hypothesis_child = hypothesis
+
+    # find global min and max
+    time_ref = [[i.start, i.end] for i in reference.itersegments()]
+    time_hyp = [[i.start, i.end] for i in hypothesis.itersegments()]
+    min_f = min([i for i, e in time_hyp] + [i for i, e in time_ref])
+    max_f = max([e for i, e in time_hyp] + [e for i, e in time_ref])
+
+    # evaluate DER
+    der = der_eval(reference, hypothesis, \
+        uem=Segment(min_f, max_f), detailed=True)
+
+    # find global min and max
+    time_ref = [[i.start, i.end] for i in reference_child.itersegments()]
+    time_hyp = [[i.start, i.end] for i in hypothesis_child.itersegments()]
+    min_f = min([i for i, e in time_hyp] + [i for i, e in time_ref])
+    max_f = max([e for i, e in time_hyp] + [e for i, e in time_ref])
+
+    # evaluate IER
+    ier = ier_eval(reference_child, hypothesis_child, \
+        uem=Segment(min_f, max_f), detailed=True)
+    prec = prec_eval(reference_child, hypothesis_child, \
+        uem=Segment(min_f, max_f), detailed=True)
+    rec  = rec_eval(reference_child, hypothesis_child, \
+        uem=Segment(min_f, max_f), detailed=True)
+
+    return {'der': der, 'ier': ier, 'precision': prec, 'recall': rec}
+
+
+def score_pair(reference, hypothesis, metrics, collar=0.1, backend='pyannote', resolution=0.001):
+    ''' score a single utterance with either backend, accumulating into metrics
+        reference, hypothesis: as returned by read_labels
+    '''
+    if backend == 'numpy':
+        scores = frame_scoring.score_segments(reference[0], reference[1], \
+            hypothesis[0], hypothesis[1], collar, resolution)
+        for metric, key in zip(metrics, ['der', 'ier', 'precision', 'recall']):
+            record(metric, scores[key], uri='reference')
+        return scores
+
+    return score_annotations(reference, hypothesis, metrics)
+
+
+def score_files(flist, reference_dir, hypothesis_dirs, collars=[0.1], backend='pyannote', resolution=0.001,
+    cache_dir=None):
+    ''' score a list of utterances for each hypothesis directory and collar,
+        reading each reference and hypothesis label once
+        returns tuple of (results, cache hits) where results is a dict mapping
+        (hypothesis index, collar index) to a tuple of (utterance scores,
+        missing hypotheses, metric results). Missing hypotheses is a list of
+        (filename, seconds) and metric results holds the per-utterance
+        components of each metric, to be merged in order
+    '''
+    systems = [(i, j) for i in range(len(hypothesis_dirs)) for j in range(len(collars))]
+    metrics = dict([((i, j), create_metrics(collars[j])) for i, j in systems])
+    missing = dict([(system, []) for system in systems])
+    utt_scores = dict([(system, []) for system in systems])
+
+    # scores of unchanged utterances are taken from the cache, if set
+    cache = ScoreCache(cache_dir) if cache_dir else None
+    configs = [{'collar': collar, 'skip_tokens': SKIP_TOKENS, 'skip_tokens_child': SKIP_TOKENS_CHILD,
+        'backend': backend, 'resolution': resolution if backend == 'numpy' else None} for collar in collars]
 
+    for f in flist:
+        ref_f = os.path.join(reference_dir, f)
+        ref_hash = cache.content_hash(ref_f) if cache else None
+
+        # labels are only read if needed for scoring
+        reference = None
+
+        for i, hypothesis_dir in enumerate(hypothesis_dirs):
+            hyp_f = os.path.join(hypothesis_dir, f)
+            hyp_hash = cache.content_hash(hyp_f) if cache else None
+            hypothesis = None
+
+            for j, collar in enumerate(collars):
+                der_eval, ier_eval, prec_eval, rec_eval = metrics[(i, j)]
+
+                key = cache.key(ref_hash, hyp_hash, configs[j]) if cache else None
+                scores = cache.get(key) if cache else None
+
+                if scores is not None:
+                    for metric, name in zip(metrics[(i, j)], ['der', 'ier', 'precision', 'recall']):
+                        merge_metric(metric, [('reference', scores[name])])
+                else:
+                    if reference is None:
+                        reference = read_labels(ref_f, 'reference', backend)
+                    # read_labels can handle non-existing files
+                    if hypothesis is None:
+                        hypothesis = read_labels(hyp_f, 'hypothesis', backend)
+
+                    scores = score_pair(reference, hypothesis, metrics[(i, j)], collar, backend, resolution)
+                    scores['reference_labels'] = ' '.join(label_sequence(reference[0], backend))
+                    scores['hypothesis_labels'] = ' '.join(label_sequence(hypothesis[0], backend))
+                    scores['missed'] = None
+                    if not os.path.isfile(hyp_f):
+                        scores['missed'] = label_seconds(reference[0], backend)
+                    if cache:
+                        cache.put(key, scores)
+
+                if scores['missed'] is not None:
+                    missing[(i, j)].append((f, scores['missed']))
+
+                der = scores['der']
+                ier = scores['ier']
+                prec = scores['precision'][prec_eval.metric_name_]
+                rec  = scores['recall'][rec_eval.metric_name_]
+                f1 = 0 if prec == 0 or rec == 0 else 2*(prec*rec) / (prec + rec)
+
+                ref_labs = scores['reference_labels']
+                hyp_labs = scores['hypothesis_labels']
+                if not hyp_labs: hyp_labs = 'no_alignment'
+
+                utt_scores[(i, j)].append( [f, prec, rec, f1, der, ier, ref_labs, hyp_labs] )
+
+    results = dict([(system, (utt_scores[system], missing[system], \
+        [metric.results_ for metric in metrics[system]])) for system in systems])
+    return results, cache.hits if cache else 0
+
+
+def check_backends(flist, reference_dir, hypothesis_dirs, collars=[0.1], resolution=0.001,
+    num_files=10, tolerance=1e-3):
+    ''' compare NumPy and pyannote backends on a sample of utterances
+        returns the number of scores where any metric differs by more than tolerance
+    '''
+    sample = sorted(random.Random(0).sample(flist, min(num_files, len(flist))))
+    names = ['diarization error rate', 'identification error rate', 'precision', 'recall']
+    keys = ['der', 'ier', 'precision', 'recall']
+
+    checked, mismatches, max_error = 0, 0, 0.0
+    for f in sample:
+        ref_f = os.path.join(reference_dir, f)
+        for hypothesis_dir in hypothesis_dirs:
+            hyp_f = os.path.join(hypothesis_dir, f)
+            for collar in collars:
+                expected = score_pair(read_labels(ref_f, 'reference'), read_labels(hyp_f, 'hypothesis'), \
+                    create_metrics(collar), collar)
+                estimated = score_pair(read_labels(ref_f, backend='numpy'), read_labels(hyp_f, backend='numpy'), \
+                    create_metrics(collar), collar, 'numpy', resolution)
+                checked += 1
+
+                errors = [abs(expected[k][n] - estimated[k][n]) for k, n in zip(keys, names)]
+                max_error = max([max_error] + errors)
+                if max(errors) > tolerance:
+                    mismatches += 1
+                    print('Warning: backends differ for {0} (collar {1:g}): {2}'.format(hyp_f, collar, ' '.join([
+                        '{0} {1:.4f}/{2:.4f}'.format(k, expected[k][n], estimated[k][n]) \
+                        for k, n in zip(keys, names)])))
+
+    print('Checked numpy backend against pyannote on {0} files ({1} scores): {2} mismatches, max error {3:.6f}'\
+        .format(len(sample), checked, mismatches, max_error))
+    return mismatches
+
+
+def score_chunk(args):
+    ''' score_files for a chunk of utterances, run by a worker process '''
+    return score_files(*args)
+
+
+def split_list(flist, nj):
+    ''' split list into nj contiguous chunks of nearly equal size '''
+    size, rest = divmod(len(flist), nj)
+    chunks, start = [], 0
+    for i in range(nj):
+        end = start + size + (1 if i < rest else 0)
+        chunks.append(flist[start:end])
+        start = end
+    return [chunk for chunk in chunks if chunk]
+
+
+def system_names(hypothesis_dirs):
+    ''' short names for hypothesis directories, from the parts of their paths
+        that differ (e.g. exp/decode_a/uxtd/lab and exp/decode_b/uxtd/lab
+        are named decode_a and decode_b)
+    '''
+    paths = [os.path.normpath(d).split(os.sep) for d in hypothesis_dirs]
+    if len(paths) == 1:
+        return [paths[0][-1]]
+
+    shortest = min([len(p) for p in paths])
+    prefix = 0
+    while prefix < shortest and len(set([p[prefix] for p in paths])) == 1:
+        prefix += 1
+    suffix = 0
+    while suffix < shortest - prefix and len(set([p[-suffix-1] for p in paths])) == 1:
+        suffix += 1
+
+    names = ['-'.join(p[prefix:len(p)-suffix]) or 'system{0}'.format(i) for i, p in enumerate(paths)]
+    if len(set(names)) < len(names):
+        names = ['{0}-{1}'.format(name, i) for i, name in enumerate(names)]
+    return names
+
+
+def write_scores(output_dir, metrics, utt_scores, missing_hypotheses, missing_hypotheses_seconds, total_references):
+    ''' write score.seconds and report.seconds
+        returns dict of global scores, for comparison between systems
+    '''
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    flist = os.listdir(reference_dir)
-    total_references = len(flist)
-    total_hypotheses = len(os.listdir(hypothesis_dir))
-
-    if total_references == 0: # no references available
-        score_f = os.path.join(output_dir, 'score.seconds')
-        score = open(score_f, 'w')
-        score.write('No references available.\n')
-        score.write('references {0}\n'.format(total_references))
-        score.write('hypotheses {0}\n'.format(total_hypotheses))
-        sys.exit(0)
-
-    collar = 0.1 # collar in seconds
-
-    der_eval = DiarizationErrorRate(collar=collar)
-    ier_eval = IdentificationErrorRate(collar=collar)
-    prec_eval    = IdentificationPrecision(collar=collar)
-    rec_eval     = IdentificationRecall(collar=collar)
-
-    skip_tokens = ['OVERLAP', 'SPN']
-    skip_tokens_child = ['OVERLAP', 'SPN', 'SLT']
-
-    missing_hypotheses = 0
-    missing_hypotheses_seconds = 0
-    utt_scores = []
-
-    for f in flist:
-        ref_f = os.path.join(reference_dir, f)
-        hyp_f = os.path.join(hypothesis_dir, f)
-
-        reference       = read_annotation(ref_f, \
-            annotation_type='reference', skip_tokens=skip_tokens)
-        reference_child = read_annotation(ref_f, \
-            annotation_type='reference', skip_tokens=skip_tokens_child)
-
-        if not os.path.isfile(hyp_f):
-            missing_hypotheses += 1
-            missed_sum = sum([i.end-i.start for i in reference.itersegments()])
-            missing_hypotheses_seconds += missed_sum
-
-        # read_annotation can handle non-existing files
-        hypothesis       = read_annotation(hyp_f, \
-            annotation_type='hypothesis', skip_tokens=skip_tokens)
-        hypothesis_child = read_annotation(hyp_f, \
-            annotation_type='hypothesis', skip_tokens=skip_tokens_child)
-
-        # find global min and max
-        time_ref = [[i.start, i.end] for i in reference.itersegments()]
-        time_hyp = [[i.start, i.end] for i in hypothesis.itersegments()]
-        min_f = min([i for i, e in time_hyp] + [i for i, e in time_ref])
-        max_f = max([e for i, e in time_hyp] + [e for i, e in time_ref])
-
-        # evaluate DER
-        der = der_eval(reference, hypothesis, \
-            uem=Segment(min_f, max_f), detailed=True)
-
-        # find global min and max
-        time_ref = [[i.start, i.end] for i in reference_child.itersegments()]
-        time_hyp = [[i.start, i.end] for i in hypothesis_child.itersegments()]
-        min_f = min([i for i, e in time_hyp] + [i for i, e in time_ref])
-        max_f = max([e for i, e in time_hyp] + [e for i, e in time_ref])
-
-        # evaluate IER
-        ier = ier_eval(reference_child, hypothesis_child, \
-            uem=Segment(min_f, max_f), detailed=True)
-        prec = prec_eval(reference_child, hypothesis_child, \
-            uem=Segment(min_f, max_f))
-        rec  = rec_eval(reference_child, hypothesis_child, \
-            uem=Segment(min_f, max_f))
-        f1 = 0 if prec == 0 or rec == 0 else 2*(prec*rec) / (prec + rec)
-
-        ref_labs = ' '.join(reference.labels())
-        hyp_labs = ' '.join(hypothesis.labels())
-
-        ref_labs = ' '.join([label for _, _, label in reference.itertracks(yield_label=True)])
-        hyp_labs = ' '.join([label for _, _, label in hypothesis.itertracks(yield_label=True)])
-
-        if not hyp_labs: hyp_labs = 'no_alignment'
-        utt_scores.append( [f, prec, rec, f1, der, ier, ref_labs, hyp_labs] )
+    der_eval, ier_eval, prec_eval, rec_eval = metrics
 
     # global scores
     ier       = abs(ier_eval)
@@ -217,8 +422,8 @@ def main(reference_dir, hypothesis_dir, output_dir):
             data.append(value)
 
         # IER score
-        ier = item[5]['identification error rate']
-        data.append( '{0:.3f}'.format(ier) )
+        item_ier = item[5]['identification error rate']
+        data.append( '{0:.3f}'.format(item_ier) )
 
         data.append(item[-2])
         data.append(item[-1])
@@ -226,12 +431,135 @@ def main(reference_dir, hypothesis_dir, output_dir):
         report.write('\t'.join(data)+'\n')
     report.close()
 
+    return {
+        'precision': precision, 'recall': recall, 'f1': f1, 'ier': ier, 'der': der,
+        'missed': aggregate['missed detection'] / aggregate['total'],
+        'false_alarm': aggregate['false alarm'] / aggregate['total'],
+        'confusion': aggregate['confusion'] / aggregate['total'],
+        'correct': aggregate['correct'] / aggregate['total'],
+        'failures': missing_hypotheses,
+    }
+
+
+def write_comparison(output_dir, comparison):
+    ''' write comparison.seconds, one row per system and collar '''
+    columns = ['precision', 'recall', 'f1', 'ier', 'der', 'missed', 'false_alarm', 'confusion', 'correct']
+
+    comparison_f = os.path.join(output_dir, 'comparison.seconds')
+    with open(comparison_f, 'w') as fid:
+        fid.write('\t'.join(['system', 'collar'] + columns + ['failures'])+'\n')
+        for name, collar, scores in comparison:
+            data = [name, '{0:g}'.format(collar)]
+            data += ['{0:.3f}'.format(scores[c]) for c in columns]
+            data.append(str(scores['failures']))
+            fid.write('\t'.join(data)+'\n')
+
+
+def main(reference_dir, hypothesis_dirs, output_dir, nj=1, backend='pyannote', resolution=0.001, check=0,
+    collars=[0.1], names=None, cache_dir=None):
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    if names is None:
+        names = system_names(hypothesis_dirs)
+    elif len(names) != len(hypothesis_dirs):
+        print('Number of names does not match number of hypothesis directories')
+        sys.exit(1)
+
+    flist = os.listdir(reference_dir)
+    total_references = len(flist)
+
+    if total_references == 0: # no references available
+        score_f = os.path.join(output_dir, 'score.seconds')
+        score = open(score_f, 'w')
+        score.write('No references available.\n')
+        score.write('references {0}\n'.format(total_references))
+        for name, hypothesis_dir in zip(names, hypothesis_dirs):
+            total_hypotheses = len(os.listdir(hypothesis_dir))
+            if len(hypothesis_dirs) == 1:
+                score.write('hypotheses {0}\n'.format(total_hypotheses))
+            else:
+                score.write('hypotheses {0} {1}\n'.format(name, total_hypotheses))
+        sys.exit(0)
+
+    # cross-validate numpy backend on a sample of utterances
+    if check:
+        check_backends(flist, reference_dir, hypothesis_dirs, collars, resolution, check)
+
+    # score utterances, in parallel chunks if nj > 1
+    if nj > 1:
+        chunks = split_list(flist, nj)
+        pool = Pool(len(chunks))
+        chunk_scores = pool.map(score_chunk, [(chunk, reference_dir, hypothesis_dirs, collars, backend, resolution, \
+            cache_dir) for chunk in chunks])
+        pool.close()
+        pool.join()
+    else:
+        chunk_scores = [score_files(flist, reference_dir, hypothesis_dirs, collars, backend, resolution, cache_dir)]
+
+    if cache_dir:
+        total = len(flist) * len(hypothesis_dirs) * len(collars)
+        hits = sum([hits for _, hits in chunk_scores])
+        print('Score cache: {0} of {1} utterance scores reused, {2} rescored'.format(hits, total, total - hits))
+
+    # a single system and collar is written to output_dir,
+    # otherwise to output_dir/system/collar_c, with a comparison table
+    single = len(hypothesis_dirs) == 1 and len(collars) == 1
+    comparison = []
+
+    for i, name in enumerate(names):
+        for j, collar in enumerate(collars):
+
+            # merge per-utterance results in file order, so that accumulated
+            # components match the serial computation exactly
+            metrics = create_metrics(collar)
+
+            missing_hypotheses = 0
+            missing_hypotheses_seconds = 0
+            utt_scores = []
+
+            for chunk, _ in chunk_scores:
+                chunk_utt_scores, chunk_missing, chunk_results = chunk[(i, j)]
+                utt_scores.extend(chunk_utt_scores)
+                for _, missed_sum in chunk_missing:
+                    missing_hypotheses += 1
+                    missing_hypotheses_seconds += missed_sum
+                for metric, results in zip(metrics, chunk_results):
+                    merge_metric(metric, results)
+
+            system_dir = output_dir
+            if not single:
+                system_dir = os.path.join(output_dir, name, 'collar_{0:g}'.format(collar))
+
+            scores = write_scores(system_dir, metrics, utt_scores, missing_hypotheses,
+                missing_hypotheses_seconds, total_references)
+            comparison.append((name, collar, scores))
+
+    if not single:
+        write_comparison(output_dir, comparison)
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('--ref', type=str, required=True, help='reference directory')
-    parser.add_argument('--hyp', type=str, required=True, help='hypothesis directory')
+    parser.add_argument('--hyp', type=str, nargs='+', required=True, help='hypothesis directories')
     parser.add_argument('--out', type=str, required=True, help='output directory')
+    parser.add_argument('--names', dest='names', type=str, nargs='+', help='names of hypothesis directories in outputs')
+    parser.add_argument('--collar', dest='collars', type=float, nargs='+', help='collars in seconds')
+    parser.add_argument('--nj', dest='nj', type=int, help='number of parallel scoring jobs')
+    parser.add_argument('--backend', dest='backend', choices=['pyannote', 'numpy'], help='scoring backend')
+    parser.add_argument('--resolution', dest='resolution', type=float, help='frame resolution of numpy backend (seconds)')
+    parser.add_argument('--check', dest='check', type=int, help='compare numpy backend to pyannote on n utterances')
+    parser.add_argument('--cache-dir', dest='cache_dir', type=str, help='persistent per-utterance score cache')
+    parser.set_defaults(names=None)
+    parser.set_defaults(collars=[0.1])
+    parser.set_defaults(nj=1)
+    parser.set_defaults(backend='pyannote')
+    parser.set_defaults(resolution=0.001)
+    parser.set_defaults(check=0)
+    parser.set_defaults(cache_dir=None)
     args = parser.parse_args()
 
-    main(args.ref, args.hyp, args.out)
+    main(args.ref, args.hyp, args.out, args.nj, args.backend, args.resolution, args.check,
+        args.collars, args.names, args.cache_dir)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Persistent on-disk cache of per-utterance alignment scores.
+
+Entries are keyed on the content of the reference and hypothesis label files
+and on the scoring configuration (collar, skip tokens, backend), so that an
+utterance is only rescored by score-alignment.py when its labels or the
+configuration change. Each entry is a single .json file with the metric
+components of DER, IER, precision and recall, from which global scores are
+rebuilt exactly, and the label sequences and missed seconds for reports.
+
+Date: 2026
+"""
+
+import os, sys
+import json
+
+# helpers shared with the ETA cache in local/data
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'data'))
+from cache_utils import file_hash
+from cache_utils import cache_key
+from cache_utils import atomic_write
+
+
+class ScoreCache(object):
+    ''' directory of cached utterance scores
+        directory: cache location, shared across runs
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def content_hash(self, filename):
+        ''' content hash of a label file, or None if it does not exist '''
+        if not os.path.isfile(filename):
+            return None
+        return file_hash(filename)
+
+    def key(self, reference_hash, hypothesis_hash, config):
+        ''' cache key for reference and hypothesis content hashes and scoring configuration '''
+        identity = [reference_hash, hypothesis_hash, sorted(config.items())]
+        return cache_key(identity)
+
+    def filename(self, key):
+        return os.path.join(self.directory, key[:2], key + '.json')
+
+    def get(self, key):
+        ''' cached scores for key, or None '''
+        filename = self.filename(key)
+        if not os.path.isfile(filename):
+            self.misses += 1
+            return None
+
+        try:
+            with open(filename) as fid:
+                entry = json.load(fid)
+        except Exception:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        ''' add entry to the cache (see cache_utils.atomic_write) '''
+        def write(tmp_filename):
+            with open(tmp_filename, 'w') as fid:
+                json.dump(entry, fid)
+
+        atomic_write(self.filename(key), write)
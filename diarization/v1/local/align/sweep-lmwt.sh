@@ -0,0 +1,110 @@
+#!/bin/bash
+
+# Sweeps language model weight and word insertion penalty for decoder alignments
+# Usage: sweep-lmwt.sh [options] <MODDIR> <DECODEDIR> <GRAPHDIR> <REFDIR>
+# e.g.: sweep-lmwt.sh --cmd "$decode_cmd" exp/mono0a exp/mono0a/decode_test exp/mono0a/graph ref/lab
+#
+# Options:
+#   --cmd <cmd>                 # how to run jobs (run.pl, queue.pl, ...), as in cmd.sh
+#   --max-jobs-run <n>          # maximum number of jobs run at once (default: all)
+#   --min-lmwt <lmwt>           # minimum language model weight (default: 7)
+#   --max-lmwt <lmwt>           # maximum language model weight (default: 17)
+#   --word-ins-penalty <list>   # word insertion penalties (default: "0.0 0.5 1.0")
+#   --collar <collar>           # scoring collar in seconds (default: 0.1)
+#   --nj-score <n>              # number of parallel scoring jobs (default: 1)
+#   --cache-dir <dir>           # persistent score cache for score-alignment.py
+#
+# One job per lattice archive (lat.JOB.gz, as written by steps/decode.sh)
+# decompresses it once and converts the 1-best path for every setting to
+# corrected labels (see labels.py) in DECODEDIR/sweep/lmwt_L_wip_W/lab.
+# Labels are scored against REFDIR and the setting with lowest DER is written
+# to DECODEDIR/lmwt and DECODEDIR/wip, which are read by decode-to-labs.sh.
+
+# begin configuration section
+cmd=run.pl
+max_jobs_run=
+min_lmwt=7
+max_lmwt=17
+word_ins_penalty="0.0 0.5 1.0"
+collar=0.1
+nj_score=1
+cache_dir=
+# end configuration section
+
+echo "$0 $@"  # Print the command line for logging
+
+[ -f ./path.sh ] && . ./path.sh
+. utils/parse_options.sh || exit 1;
+
+if [ $# -ne 4 ]; then
+    echo "Usage: $0 [options] <MODDIR> <DECODEDIR> <GRAPHDIR> <REFDIR>"
+    exit 1;
+fi
+
+MODDIR=$1       # model directory, e.g. './exp/mono0a'
+DECODEDIR=$2    # decoding directory, e.g. './exp/mono0a/decode_test'
+GRAPHDIR=$3     # graph directory, e.g. './exp/mono0a/graph'
+REFDIR=$4       # reference label directory
+SWEEPDIR=${DECODEDIR}/sweep
+
+# one job per lattice archive
+if [ -f ${DECODEDIR}/num_jobs ]; then
+    nj=$(cat ${DECODEDIR}/num_jobs)
+else
+    nj=$(ls ${DECODEDIR}/lat.*.gz | wc -l)
+fi
+
+# labels are rewritten from scratch
+[ -d ${SWEEPDIR} ] && rm -r ${SWEEPDIR}
+mkdir -p ${SWEEPDIR}/log
+
+settings=
+for wip in $word_ins_penalty; do
+    for lmwt in $(seq $min_lmwt $max_lmwt); do
+        settings="$settings lmwt_${lmwt}_wip_${wip}"
+        mkdir -p ${SWEEPDIR}/lmwt_${lmwt}_wip_${wip}/lab
+    done
+done
+[ $(echo $settings | wc -w) -lt 2 ] && echo "$0: sweep needs at least two settings" && exit 1;
+
+# convert lattice to ctm and ctm to corrected HTK lab, for all settings
+# each archive is decompressed once to ${SWEEPDIR}/lat.JOB.ark and read from there
+$cmd ${max_jobs_run:+--max-jobs-run $max_jobs_run} JOB=1:$nj ${SWEEPDIR}/log/lat_to_lab.JOB.log \
+    gunzip -c ${DECODEDIR}/lat.JOB.gz \> ${SWEEPDIR}/lat.JOB.ark \|\| exit 1\; \
+    for wip in $word_ins_penalty\; do \
+    for lmwt in $(seq $min_lmwt $max_lmwt)\; do \
+        lattice-add-penalty --word-ins-penalty=\$wip ark:${SWEEPDIR}/lat.JOB.ark ark:- \| \
+        lattice-1best --lm-scale=\$lmwt ark:- ark:- \| \
+        lattice-align-words-lexicon ${GRAPHDIR}/phones/align_lexicon.int ${MODDIR}/final.mdl ark:- ark:- \| \
+        nbest-to-ctm ark:- - \| \
+        ./utils/int2sym.pl -f 5 ${GRAPHDIR}/words.txt \| \
+        python ./local/align/labels.py --ctm - --labdir ${SWEEPDIR}/lmwt_\${lmwt}_wip_\${wip}/lab \|\| exit 1\; \
+    done\; \
+    done\; \
+    rm ${SWEEPDIR}/lat.JOB.ark || exit 1;
+
+hypdirs=
+for setting in $settings; do
+    hypdirs="$hypdirs ${SWEEPDIR}/${setting}/lab"
+done
+
+# score all settings in one run
+# requires Python's pyannote.metrics
+python ./local/align/score-alignment.py \
+    --ref ${REFDIR} \
+    --hyp $hypdirs \
+    --names $settings \
+    --out ${SWEEPDIR}/score \
+    --collar ${collar} \
+    --nj ${nj_score} ${cache_dir:+--cache-dir $cache_dir} || exit 1;
+
+# select setting with lowest DER (column 7 of comparison table)
+# ties are resolved in favour of the first setting
+best=$(tail -n +2 ${SWEEPDIR}/score/comparison.seconds | sort -s -t$'\t' -k7,7g | head -n 1)
+[ -z "$best" ] && echo "$0: no scores in ${SWEEPDIR}/score/comparison.seconds" && exit 1;
+
+setting=$(echo "$best" | cut -f 1)
+echo "$setting" | sed 's/^lmwt_\(.*\)_wip_\(.*\)$/\1/' > ${DECODEDIR}/lmwt
+echo "$setting" | sed 's/^lmwt_\(.*\)_wip_\(.*\)$/\2/' > ${DECODEDIR}/wip
+
+echo "$0: best setting lmwt=$(cat ${DECODEDIR}/lmwt) wip=$(cat ${DECODEDIR}/wip) (DER $(echo "$best" | cut -f 7))"
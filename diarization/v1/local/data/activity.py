@@ -0,0 +1,434 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Windowed-moment engine for Estimated Tongue Activity (ETA).
+
+Tongue activity at frame i is the mean over pixels of the standard deviation
+of each pixel across frames [i-window_size, i+window_size). Instead of calling
+np.std on a fresh window for every frame, per-pixel window sums of x and x^2
+are taken from cumulative sums in a single vectorized pass, so the cost no
+longer grows with the window size.
+
+Ultrasound files are memory-mapped and processed in overlapping chunks of
+frames, sized to a memory budget, so that memory use is bounded regardless of
+the length of the recording.
+
+Moments can be accumulated in float64, float32 or integer (int32) arithmetic.
+Chunks are kept short enough for the accumulated sums to remain exact in the
+chosen type, so reduced precision only affects the final variance and mean.
+Window sizes for which even a single window cannot be exact raise ValueError.
+A subset of pixels (strided scanlines/pixels, or a region of interest) can be
+used instead of the full frame.
+
+The same pass can also give activity within sectors of consecutive scanlines
+and the frame-difference energy in each window, as extra feature columns.
+
+OnlineActivityEstimator computes the same activity from a live stream of
+frames, given in blocks, with a lookahead of window_size-1 frames and running
+min-max normalisation.
+
+Date: 2026
+"""
+
+import os
+import numpy as np
+
+from collections import deque
+
+
+# approximate working memory (bytes) per frame pixel in sliding_features:
+# float copy of the data, cumulative sums, window sums and variances
+BYTES_PER_PIXEL = 48
+
+# default memory budget per process (bytes)
+DEFAULT_MAX_MEMORY = 256 * 1024 * 1024
+
+# for each precision: type of accumulated moments, type of
+# variances, and maximum number of frames with exact sums of 8-bit x^2
+PRECISION = {
+    'float64': (np.float64, np.float64, None),
+    'float32': (np.float32, np.float32, 2**24 // 255**2),
+    'int':     (np.int32,   np.float32, 2**31 // 255**2),
+}
+
+
+class UltrasoundReader(object):
+    ''' memory-mapped reader for raw 8-bit ultrasound (.ult) files '''
+
+    def __init__(self, filename, frame_size):
+        self.filename = filename
+        self.frame_size = frame_size
+        self.total_frames = int(os.path.getsize(filename) // frame_size)
+
+    def read(self, start, end):
+        ''' map frames [start, end) as a (frames, frame_size) uint8 matrix '''
+        end = min(end, self.total_frames)
+        if end <= start:
+            return np.zeros((0, self.frame_size), dtype=np.uint8)
+        return np.memmap(self.filename, dtype=np.uint8, mode='r',
+            offset=start*self.frame_size, shape=(end-start, self.frame_size))
+
+    def iter_chunks(self, chunk_size, overlap=0):
+        ''' iterate over chunks of chunk_size frames, each extended by overlap frames
+            yields tuples of (start_frame, frames)
+        '''
+        for start in range(0, max(self.total_frames-overlap, 0), chunk_size):
+            yield start, self.read(start, start+chunk_size+overlap)
+
+
+def select_pixels(num_vectors, pix_per_vector, scanline_stride=1, pixel_stride=1, roi=None):
+    ''' flat indices of the pixels to use within a frame
+        frames are stored scanline by scanline (num_vectors x pix_per_vector)
+        roi: (first_scanline, last_scanline, first_pixel, last_pixel),
+        where last values are excluded. Uses the full frame if not set
+    '''
+    if roi is None:
+        roi = (0, num_vectors, 0, pix_per_vector)
+    first_scanline, last_scanline, first_pixel, last_pixel = roi
+
+    scanlines = np.arange(num_vectors)[first_scanline:last_scanline:scanline_stride]
+    pixels = np.arange(pix_per_vector)[first_pixel:last_pixel:pixel_stride]
+    return (scanlines.reshape(-1, 1) * pix_per_vector + pixels.reshape(1, -1)).reshape(-1,)
+
+
+def scanline_regions(num_vectors, pix_per_vector, num_regions, pixels=None):
+    ''' split scanlines into num_regions sectors of consecutive scanlines
+        returns a list with a slice of frame columns for each sector, where
+        columns index the selected pixels if pixels is set (see select_pixels)
+    '''
+    if pixels is None:
+        pixels = np.arange(num_vectors * pix_per_vector)
+    scanlines = np.asarray(pixels) // pix_per_vector
+    used = np.unique(scanlines)
+
+    if num_regions > len(used):
+        raise ValueError('Cannot split {0} scanlines into {1} regions'.format(len(used), num_regions))
+
+    # pixels are stored scanline by scanline, so each sector is contiguous
+    bounds = np.searchsorted(scanlines, [sector[0] for sector in np.array_split(used, num_regions)])
+    bounds = [int(b) for b in bounds] + [len(scanlines)]
+    return [slice(bounds[i], bounds[i+1]) for i in range(num_regions)]
+
+
+def check_precision(window_size, precision='float64', num_frames=None):
+    ''' raise ValueError if window moments over num_frames frames (at least
+        one window, 2*window_size+1 frames) would not be exact in the
+        arithmetic of the given precision (see PRECISION)
+    '''
+    n = 2 * window_size
+    max_frames = PRECISION[precision][2]
+    num_frames = max(num_frames or 0, n+1)
+
+    if max_frames and num_frames > max_frames:
+        raise ValueError('Window size {0} needs {1} frames, over the {2} frames with exact '
+            '{3} moments'.format(window_size, num_frames, max_frames, precision))
+
+    # n^2 * variance is computed in the moment type (see moments_to_std)
+    if precision == 'int' and n * n * 255**2 >= 2**31:
+        raise ValueError('Window size {0} overflows int moments, use float64'.format(window_size))
+
+
+def window_moments(ultrasound, window_size, dtype=np.float64):
+    ''' per-pixel sum of x and x^2 over every window of 2*window_size frames
+        returns two arrays of shape (total_frames - 2*window_size + 1, frame_size)
+    '''
+    n = 2 * window_size
+    data = ultrasound.astype(dtype)
+
+    # cumulative sums with a leading row of zeros,
+    # so that window sums are simple differences
+    csum = np.zeros((data.shape[0]+1, data.shape[1]), dtype=dtype)
+    np.cumsum(data, axis=0, out=csum[1:])
+    sum_x = csum[n:] - csum[:-n]
+
+    np.square(data, out=data)
+    np.cumsum(data, axis=0, out=csum[1:])
+    sum_x2 = csum[n:] - csum[:-n]
+
+    return sum_x, sum_x2
+
+
+def difference_energy(ultrasound, window_size=20, starts=None):
+    ''' mean squared difference between consecutive frames in each window
+        ultrasound is a (total_frames, frame_size) matrix, with windows
+        as in sliding_features
+    '''
+    n = 2 * window_size
+    total_frames = ultrasound.shape[0]
+
+    # squared difference between each frame and the previous one,
+    # summed over pixels in integers, so that window sums are exact
+    energy = np.zeros(total_frames, dtype=np.int64)
+    for start in range(0, total_frames-1, n):
+        block = ultrasound[start:start+n+1].astype(np.int32)
+        energy[start+1:start+block.shape[0]] = np.sum(np.square(np.diff(block, axis=0)), axis=1)
+
+    # window sums over the n-1 differences within each window
+    csum = np.cumsum(energy)
+    window_energy = (csum[n-1:] - csum[:-n+1])[:total_frames-n] / float((n-1) * ultrasound.shape[1])
+
+    if starts is not None:
+        window_energy = window_energy[starts]
+    return window_energy
+
+
+def sliding_features(ultrasound, window_size=20, starts=None, precision='float64',
+    regions=None, energy=False):
+    ''' tongue activity and related features for frames window_size to
+        total_frames-window_size
+        ultrasound is a (total_frames, frame_size) matrix
+        if starts is set, only windows starting at these frames are evaluated
+        precision is one of float64, float32, or int (see PRECISION)
+        regions: list of slices of frame columns (see scanline_regions), adding
+        activity over the pixels in each region
+        energy: add frame-difference energy (see difference_energy)
+        returns a (windows, features) matrix with activity in the first column,
+        then activity in each region, and then frame-difference energy,
+        or an empty matrix if there are not enough frames
+    '''
+    moment_type, var_type, _ = PRECISION[precision]
+    n = 2 * window_size
+    total_frames = ultrasound.shape[0]
+    regions = regions or []
+
+    if total_frames <= n:
+        return np.zeros((0, 1 + len(regions) + int(energy)))
+
+    check_precision(window_size, precision, total_frames)
+    sum_x, sum_x2 = window_moments(ultrasound, window_size, moment_type)
+
+    # the last window is not used by the frame-wise definition
+    sum_x, sum_x2 = sum_x[:-1], sum_x2[:-1]
+
+    if starts is not None:
+        sum_x, sum_x2 = sum_x[starts], sum_x2[starts]
+
+    std = moments_to_std(sum_x, sum_x2, n, precision)
+    del sum_x, sum_x2
+
+    features = [np.mean(std, axis=1, dtype=var_type)]
+    for region in regions:
+        features.append(np.mean(std[:, region], axis=1, dtype=var_type))
+    if energy:
+        features.append(difference_energy(ultrasound, window_size, starts))
+
+    return np.stack(features, axis=1).astype(np.float64)
+
+
+def moments_to_activity(sum_x, sum_x2, n, precision='float64'):
+    ''' mean over pixels of the standard deviation in each window,
+        given window moments over n frames (see window_moments)
+    '''
+    var_type = PRECISION[precision][1]
+    std = moments_to_std(sum_x, sum_x2, n, precision)
+    return np.mean(std, axis=1, dtype=var_type).astype(np.float64)
+
+
+def moments_to_std(sum_x, sum_x2, n, precision='float64'):
+    ''' per-pixel standard deviation in each window,
+        given window moments over n frames (see window_moments)
+    '''
+    var_type = PRECISION[precision][1]
+
+    # population variance from window moments
+    if precision == 'int':
+        # n^2 * variance is exact in integer arithmetic
+        var = n * sum_x2 - np.square(sum_x)
+        std = np.sqrt(var.astype(var_type)) / n
+    else:
+        var = sum_x2 / n - np.square(sum_x / n)
+        np.maximum(var, 0.0, out=var)
+        std = np.sqrt(var)
+
+    return std
+
+
+def chunk_size(frame_size, window_size, max_memory=DEFAULT_MAX_MEMORY):
+    ''' number of windows per chunk so that a chunk fits in max_memory bytes '''
+    frames = int(max_memory // (frame_size * BYTES_PER_PIXEL))
+    return max(frames - 2*window_size, 1)
+
+
+def activity_from_file(reader, window_size=20, max_memory=DEFAULT_MAX_MEMORY,
+    starts=None, precision='float64', pixels=None, regions=None, energy=False):
+    ''' tongue activity for an UltrasoundReader, computed chunk by chunk
+        gives the same output as sliding_features over the full recording
+        if starts is set (sorted window start frames), only these
+        windows are evaluated
+        if pixels is set (see select_pixels), only these pixels are used
+        if regions or energy are set, returns a (windows, features) matrix
+        as in sliding_features, and a vector of activity otherwise
+    '''
+    n = 2 * window_size
+    total_windows = reader.total_frames - n
+    num_features = 1 + len(regions or []) + int(energy)
+
+    if total_windows <= 0:
+        return np.zeros(0) if num_features == 1 else np.zeros((0, num_features))
+
+    if starts is None:
+        starts = np.arange(total_windows)
+
+    frame_size = reader.frame_size if pixels is None else len(pixels)
+
+    # limit chunks so that accumulated moments are exact
+    check_precision(window_size, precision)
+    max_frames = PRECISION[precision][2]
+    size = chunk_size(frame_size, window_size, max_memory)
+    if max_frames:
+        size = max(min(size, max_frames - n), 1)
+
+    activity = np.zeros((len(starts), num_features))
+
+    # consecutive chunks overlap by 2*window_size frames,
+    # so that every window falls entirely within one chunk
+    for start, frames in reader.iter_chunks(size, overlap=n):
+        first, last = np.searchsorted(starts, [start, start+size])
+        if first == last:
+            continue
+        if pixels is not None:
+            frames = frames[:, pixels]
+        values = sliding_features(frames, window_size, starts[first:last]-start,
+            precision, regions, energy)
+        activity[first:last] = values
+        del frames
+
+    if num_features == 1:
+        return activity[:, 0]
+    return activity
+
+
+class OnlineActivityEstimator(object):
+    ''' tongue activity for a live stream of ultrasound frames
+        frames are given in blocks of any size with process(), which returns
+        activity for every frame that can be estimated so far. The value for
+        frame i needs frames up to i+window_size-1, so there is a lookahead of
+        window_size-1 frames beyond the last estimated frame. flush() returns the remaining frames at the end.
+
+        Raw activity matches activity_from_file (after padding the first and
+        last window_size frames), except at the final window_size frames,
+        where the end of the stream is not known in advance.
+
+        frame_size: number of pixels per frame
+        window_size: frames on each side of the analysis window
+        normalisation: running min-max normalisation, over the last
+        norm_window frames ('window'), with statistics decaying towards the
+        current value by a factor decay per frame ('decay'), or None
+        precision: arithmetic for window moments (see PRECISION)
+        pixels: subset of pixels to use (see select_pixels)
+    '''
+
+    def __init__(self, frame_size, window_size=20, normalisation='window', norm_window=1200,
+        decay=0.999, precision='float64', pixels=None):
+        if normalisation not in ['window', 'decay', None]:
+            raise ValueError('Unknown normalisation: {0}'.format(normalisation))
+
+        self.frame_size = frame_size
+        self.window_size = window_size
+        self.normalisation = normalisation
+        self.norm_window = norm_window
+        self.decay = decay
+        self.precision = precision
+        self.pixels = pixels
+
+        # last 2*window_size frames, as a ring buffer, and their
+        # running per-pixel sums of x and x^2 (exact in int64)
+        n = 2 * window_size
+        size = frame_size if pixels is None else len(pixels)
+        self.buffer = np.zeros((n, size), dtype=np.int64)
+        self.sum_x = np.zeros(size, dtype=np.int64)
+        self.sum_x2 = np.zeros(size, dtype=np.int64)
+        self.frames_in = 0
+        self.frames_out = 0
+        self.last_value = None
+
+        # running normalisation statistics
+        self.min_queue = deque()
+        self.max_queue = deque()
+        self.min_value = None
+        self.max_value = None
+
+    @property
+    def latency(self):
+        ''' frames received but not yet estimated '''
+        return self.frames_in - self.frames_out
+
+    def process(self, frames):
+        ''' add a block of frames (bytes or uint8 array)
+            returns activity for all frames that can now be estimated
+        '''
+        if isinstance(frames, bytes):
+            frames = np.frombuffer(frames, dtype=np.uint8)
+        frames = np.asarray(frames, dtype=np.uint8).reshape(-1, self.frame_size)
+
+        if self.pixels is not None:
+            frames = frames[:, self.pixels]
+
+        n = 2 * self.window_size
+        moment_type = PRECISION[self.precision][0]
+        raw = []
+
+        for frame in frames.astype(np.int64):
+            # replace the oldest frame in the window
+            position = self.frames_in % n
+            old = self.buffer[position]
+            self.sum_x += frame - old
+            self.sum_x2 += frame * frame - old * old
+            self.buffer[position] = frame
+            self.frames_in += 1
+
+            if self.frames_in >= n:
+                value = moments_to_activity(self.sum_x.astype(moment_type).reshape(1, -1),
+                    self.sum_x2.astype(moment_type).reshape(1, -1), n, self.precision)
+                raw.append(value[0])
+
+        # the first window also covers the first window_size frames
+        if raw and self.frames_out == 0:
+            raw = [raw[0]] * self.window_size + raw
+
+        return self.emit(raw)
+
+    def flush(self):
+        ''' activity for the remaining frames at the end of the stream,
+            repeating the last estimated value
+        '''
+        if self.last_value is None:
+            return self.emit([0.0] * self.latency)
+        return self.emit([self.last_value] * self.latency)
+
+    def emit(self, raw):
+        ''' normalise and count output values '''
+        output = np.zeros(len(raw))
+        for i, value in enumerate(raw):
+            output[i] = self.normalise(self.frames_out + i, value)
+        if raw:
+            self.last_value = raw[-1]
+        self.frames_out += len(raw)
+        return output
+
+    def normalise(self, frame, value):
+        ''' min-max normalise the value for a single frame with running statistics '''
+        if self.normalisation is None:
+            return value
+
+        if self.normalisation == 'window':
+            # monotonic queues of (frame, value), so that the minimum and
+            # maximum over the last norm_window frames are at the front
+            for queue, keep in [(self.min_queue, lambda v: v < value), (self.max_queue, lambda v: v > value)]:
+                while queue and not keep(queue[-1][1]):
+                    queue.pop()
+                queue.append((frame, value))
+                while queue[0][0] <= frame - self.norm_window:
+                    queue.popleft()
+            self.min_value = self.min_queue[0][1]
+            self.max_value = self.max_queue[0][1]
+        else:
+            if self.min_value is None:
+                self.min_value, self.max_value = value, value
+            self.min_value = min(value, self.decay * self.min_value + (1 - self.decay) * value)
+            self.max_value = max(value, self.decay * self.max_value + (1 - self.decay) * value)
+
+        value_range = self.max_value - self.min_value
+        if value_range <= 0:
+            return 0.0
+        return (value - self.min_value) / value_range
@@ -3,6 +3,19 @@
 """
 Append tongue activity to Kaldi's acoustic features.
 
+ETA is mapped onto the acoustic frame timeline using its frame rate and time
+offset. Acoustic frame k starts at k*frame_shift, and ETA sample j is at time
+offset + (j - int(offset*fps)) / fps, since ETA is padded with int(offset*fps)
+values before the first ultrasound frame. ETA already computed at the acoustic
+frame rate (make_tongue_activity.py --mfcc-config) is copied frame by frame.
+Multi-feature ETA appends one feature dimension per ETA column.
+
+Merged features are streamed to the output ark/scp as they are produced,
+compressed as with copy-feats --compress=true unless disabled.
+
+Feature scp shards are independent, so they can be processed in parallel
+over multiple CPU cores, each writing its own ark/scp pair.
+
 Date: 2018
 Author: M. Sam Ribeiro
 """
@@ -13,123 +26,143 @@ import argparse
 import kaldi_io
 import numpy as np
 
+from functools import partial
+from multiprocessing import Pool
+from multiprocessing import cpu_count
 
-def downsample(data, n=4):
-    ''' downsample array by dropping every n-th sample '''
-    return [v for i,v in enumerate(data) if i%(n+1)]
+from eta_io import EtaIndex
+from eta_io import acoustic_frame_positions
+from feats_io import FeatureWriter
+from utils import read_frame_shift
 
 
-def upsample(data, n=4):
-    ''' upsample array by repeating every n-th sample '''
-    upsampled = []
-    for i, v in enumerate(data):
-        upsampled.append(v)
-        if i%(n+1)==0: upsampled.append(v)
-    return upsampled
+def align_activity(eta, offset, fps, num_frames, frame_shift=0.01, interpolate=False):
+    ''' resample ETA onto num_frames acoustic frames spaced frame_shift seconds apart
+        uses nearest-frame lookup, or linear interpolation if interpolate is set
+        eta is a vector, or a (num_samples, num_columns) matrix
+        returns tuple of (aligned_eta, drift, extrapolated) where aligned_eta
+        is a (num_frames, num_columns) matrix, drift is
+        the ETA duration minus the acoustic duration in seconds and extrapolated
+        is the number of acoustic frames that fall beyond the end of ETA
+    '''
+    eta = np.asarray(eta)
+    if eta.ndim == 1:
+        eta = eta.reshape(-1, 1)
+    num_samples = eta.shape[0]
 
+    if fps <= 0 or eta.size == 0:
+        return np.zeros((num_frames, eta.shape[1])), -num_frames*frame_shift, num_frames
 
-def read_tongue_activity(directory):
-    ''' read tongue activity from directory 
-        returns dictionary where keys are file_ids and values
-        are tuples of [offset, fps, tongue_activity_array]
-    '''
-    data = {}
+    # fractional ETA sample for each acoustic frame
+    position = acoustic_frame_positions(num_frames, offset, fps, frame_shift)
 
-    for f in os.listdir(directory):
-        filename = os.path.join(directory, f)
+    # ETA computed at the acoustic frame rate is copied as is
+    if offset == 0 and abs(fps * frame_shift - 1.0) < 1e-6:
+        index = np.minimum(np.arange(num_frames), num_samples-1)
+        aligned = eta[index]
+    elif interpolate:
+        samples = np.arange(num_samples)
+        aligned = np.stack([np.interp(position, samples, column) for column in eta.T], axis=1)
+    else:
+        index = np.clip(np.rint(position).astype(int), 0, num_samples-1)
+        aligned = eta[index]
 
-        with open(filename) as fid:
-            for line in fid.readlines():
-                file_id, offset, fps, eta = line.split(',')
-                eta = [float(v) for v in eta.split()]
-                offset = float(offset)
-                fps = float(fps)
+    drift = num_samples / fps - num_frames * frame_shift
+    extrapolated = int(np.sum(position > num_samples-1))
 
-                if file_id in data:
-                    print('Warning: unexpected repeated file id {0}'.format(file_id))
+    return aligned, drift, extrapolated
 
-                data[file_id] = [offset, fps, eta]
-    return data
 
 
+def append_scp(scp, in_feats_dir, out_feats_dir, eta_index, frame_shift=0.01, interpolate=False, compress=True):
+    ''' 
+        Single pickable function to append ETA to one feature scp shard.
+        To be used with multiprocessing.Pool (via functools.partial).
+        Writes ark/scp with the same name as the input scp to out_feats_dir
+        Returns log messages, so that they can be printed in shard order
+    '''
+    in_scp_filename  = os.path.join(in_feats_dir, scp)
+    out_scp_filename = os.path.join(out_feats_dir, scp)
+    out_ark_filename = os.path.join(out_feats_dir, scp.replace('.scp', '.ark'))
+    drift, extrapolated = [], 0
+    messages = []
 
+    scp_data = kaldi_io.read_mat_scp(in_scp_filename)
+    writer = FeatureWriter(out_ark_filename, out_scp_filename, compress)
 
-def main(in_feats_dir, eta_dir, out_feats_dir):
+    for key, mat in scp_data:
 
-    print('Appending estimated tongue activity to features in {0}'.format(in_feats_dir))
+        if key not in eta_index:
+            messages.append('Warning: could not find ETA data for {0}'.format(key))
+            continue
 
-    if not os.path.exists(out_feats_dir):
-        os.makedirs(out_feats_dir)
+        offset, fps, eta = eta_index.get(key)
 
-    # read estimated tongue activity
-    eta_data = read_tongue_activity(eta_dir)
+        # ETA is normally at a higher sampling rate than acoustic features,
+        # so it is resampled to the acoustic frame timeline
+        eta, utt_drift, utt_extrapolated = align_activity(eta, offset, fps,
+            mat.shape[0], frame_shift, interpolate)
+        drift.append(abs(utt_drift))
+        extrapolated += utt_extrapolated
 
-    # get scp filelist
-    scp_list = sorted([f for f in os.listdir(in_feats_dir) if f.endswith('.scp')])
-    print('Found {0} scp feature files to process'.format(len(scp_list)))
+        eta = eta.astype(mat.dtype)
+        mat = np.concatenate([mat, eta], axis=1)
 
-    for scp in scp_list:
-        in_scp_filename  = os.path.join(in_feats_dir, scp)
-        upsampled, downsampled = 0, 0
+        writer.write(key, mat)
 
-        scp_data = kaldi_io.read_mat_scp(in_scp_filename)
-        eta_scp_data = {}
+    writer.close()
 
-        for key, mat in scp_data:
+    if drift:
+        messages.append('{0} -- {1} utterances, drift mean {2:.3f}s max {3:.3f}s, {4} frames beyond ETA'\
+            .format(scp, len(drift), np.mean(drift), np.max(drift), extrapolated))
 
-            if key not in eta_data:
-                print('Warning: could not find ETA data for {0}'.format(key))
-                continue
+    return messages
 
-            eta = eta_data[key][2]
-            eta_size = len(eta)
-            mfcc_size = mat.shape[0]
 
-            # ETA is normally at a higher sampling rate, so we need to downsample
-            if eta_size > mfcc_size:
-                downsampling_attempts = 0
-                while abs(eta_size-mfcc_size) > 0 and downsampling_attempts < 5:
-                    n = int( eta_size / (eta_size-mfcc_size) )
-                    eta = downsample(eta, n=n)
-                    eta_size = len(eta)
-                    downsampling_attempts += 1
-                downsampled += 1
 
-            # but in some cases, this might not happen, so we upsample
-            else:
-                upsampling_attempts = 0
-                while abs(mfcc_size-eta_size) > 0 and upsampling_attempts < 5:
-                    n = int( mfcc_size / (mfcc_size-eta_size) )
-                    eta = upsample(eta, n=n)
-                    eta_size = len(eta)
-                    upsampling_attempts += 1
-                upsampled += 1
+def main(in_feats_dir, eta_dir, out_feats_dir, frame_shift=0.01, interpolate=False, compress=True, max_cores=1):
 
-            if abs(eta_size-mfcc_size) > 0:
-                size = min(eta_size, mfcc_size)
-                eta = eta[:size]
-                mat = mat[:size]
+    print('Appending estimated tongue activity to features in {0}'.format(in_feats_dir))
 
-            eta = np.array(eta).reshape(-1, 1)
-            mat = np.concatenate([mat, eta], axis=1)
+    if not os.path.exists(out_feats_dir):
+        os.makedirs(out_feats_dir)
 
-            eta_scp_data[key] = mat
+    # index estimated tongue activity, which is read on demand
+    try:
+        eta_index = EtaIndex(eta_dir)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    print('Found estimated tongue activity for {0} utterances'.format(len(eta_index)))
 
-        print('{0} -- upsampled {1}, downsampled {2}'.format(scp, upsampled, downsampled))
-        out_scp_filename = os.path.join(out_feats_dir, scp) 
-        tmp_ark_filename = os.path.join(out_feats_dir, scp.replace('.scp', '.tmp.ark'))
-        out_ark_filename = os.path.join(out_feats_dir, scp.replace('.scp', '.ark'))
+    # get scp filelist
+    scp_list = sorted([f for f in os.listdir(in_feats_dir) if f.endswith('.scp')])
+
+    # use the minimum over maximum requested cores,
+    # available cores, or number of scp files
+    cores = max(min([max_cores, len(scp_list), cpu_count()]), 1)
+    print('Found {0} scp feature files to process over {1} cores'.format(len(scp_list), cores))
 
-        out_scp_data = ((key,mat) for key,mat in eta_scp_data.items())
+    append = partial(append_scp, in_feats_dir=in_feats_dir, out_feats_dir=out_feats_dir,
+        eta_index=eta_index, frame_shift=frame_shift, interpolate=interpolate, compress=compress)
 
-        with open(tmp_ark_filename,'wb') as fid:
-            for key, mat in out_scp_data: 
-                kaldi_io.write_mat(fid, mat, key=key)
+    pool = None
+    if cores > 1:
+        pool = Pool(processes=cores)
+        results = pool.imap(append, scp_list)
+    else:
+        results = (append(scp) for scp in scp_list)
 
-        cmd = 'copy-feats --compress=true ark:{0} ark,scp:{1},{2}'\
-            .format(tmp_ark_filename, out_ark_filename, out_scp_filename)
-        os.system(cmd)
-        os.remove(tmp_ark_filename)
+    # results are in the same order as scp_list, and messages
+    # for each shard are printed as soon as it is done
+    for messages in results:
+        for message in messages:
+            print(message)
+        sys.stdout.flush()
+
+    if pool:
+        pool.close()
+        pool.join()
 
 
 
@@ -138,6 +171,17 @@ if __name__ == "__main__":
     parser.add_argument('input_dir',  type=str, help='input Kaldi feature directory')
     parser.add_argument('eta_dir',    type=str, help='input directory with estimated tongue activity')
     parser.add_argument('output_dir', type=str, help='output feature directory')
+    parser.add_argument('--mfcc-config', dest='mfcc_config', type=str, help='config with frame shift of acoustic features')
+    parser.add_argument('--interpolate', dest='interpolate', action='store_true', help='linear interpolation instead of nearest ETA frame')
+    parser.add_argument('--no-compress', dest='compress', action='store_false', help='write uncompressed features')
+    parser.add_argument('--nj', '--max-cores', dest='max_cores', type=int, help='Maximum number of CPU cores')
+    parser.set_defaults(mfcc_config=None)
+    parser.set_defaults(interpolate=False)
+    parser.set_defaults(compress=True)
+    parser.set_defaults(max_cores=1)
     args = parser.parse_args()
 
-    main(args.input_dir, args.eta_dir, args.output_dir)
+    frame_shift = read_frame_shift(args.mfcc_config)
+
+    main(args.input_dir, args.eta_dir, args.output_dir, frame_shift,
+        args.interpolate, args.compress, args.max_cores)
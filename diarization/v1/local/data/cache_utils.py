@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Helpers shared by persistent on-disk caches (see eta_cache.py and
+local/align/score_cache.py): content hashes of input files, cache keys
+and atomic writes of cache entries.
+
+Date: 2026
+"""
+
+import os
+import hashlib
+
+
+def file_hash(filename):
+    ''' sha1 content hash of a file, read in blocks of 1MB '''
+    sha = hashlib.sha1()
+    with open(filename, 'rb') as fid:
+        for block in iter(lambda: fid.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def cache_key(identity):
+    ''' cache key for a list identifying an entry (input files and configuration)
+        configuration dicts should be given as sorted lists of items
+    '''
+    return hashlib.sha1(repr(identity).encode('utf-8')).hexdigest()
+
+
+def atomic_write(filename, write):
+    ''' write a cache entry with write(tmp_filename) and rename it to filename
+        concurrent workers never see partial entries. Temporary files keep
+        the extension of filename, with .tmp before it (e.g. key.123.tmp.npz)
+    '''
+    directory = os.path.dirname(filename)
+    if directory and not os.path.exists(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            pass # created by another worker
+
+    root, ext = os.path.splitext(filename)
+    tmp_filename = '{0}.{1}.tmp{2}'.format(root, os.getpid(), ext)
+    write(tmp_filename)
+    os.rename(tmp_filename, filename)
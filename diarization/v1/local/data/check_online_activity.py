@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Replay ultrasound recordings through OnlineActivityEstimator.
+
+Each .ult file in a Kaldi data directory is fed to the online estimator in
+blocks of frames, as if it were a live stream, and checked against the batch
+computation used by make_tongue_activity.py:
+
+latency: after every block, all frames up to window_size-1 frames before
+the last input frame must have been estimated (none at all before the first
+full window), and processing a block must take less time than the block
+lasts in real time
+raw activity: must agree with activity_from_file, up to the final
+window_size frames
+normalised activity: running normalisation is compared with min-max
+normalisation over the whole utterance (correlation, reported only)
+
+Exits with a non-zero status if any check fails.
+
+Date: 2026
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+from activity import UltrasoundReader
+from activity import OnlineActivityEstimator
+from activity import activity_from_file
+
+from make_tongue_activity import read_filelist
+from make_tongue_activity import compute_tongue_activity
+
+from utils import read_ultrasound_params
+
+
+def replay(reader, estimator, block_size):
+    ''' feed all frames of an UltrasoundReader to an online estimator
+        returns tuple of (activity, maximum block time, maximum latency, latency errors)
+    '''
+    window_size = estimator.window_size
+    output, max_time, max_latency, errors = [], 0.0, 0, []
+
+    for _, frames in reader.iter_chunks(block_size):
+        start = time.time()
+        output.append(estimator.process(np.array(frames)))
+        max_time = max(max_time, time.time() - start)
+
+        # first output once a full window is available
+        expected = 0
+        if estimator.frames_in >= 2 * window_size:
+            expected = estimator.frames_in - window_size + 1
+        if estimator.frames_out != expected:
+            errors.append((estimator.frames_in, estimator.frames_out, expected))
+        if estimator.frames_out:
+            max_latency = max(max_latency, estimator.latency)
+
+    output.append(estimator.flush())
+    return np.concatenate(output), max_time, max_latency, errors
+
+
+def check_file(item, block_size=4, window_size=20, normalisation='window', norm_window=1200,
+    decay=0.999, tolerance=1e-9):
+    ''' replay a single file, print results, and return True if all checks pass '''
+    file_id, filename = item
+    params = read_ultrasound_params(filename.replace('.wav', '.param'))
+    reader = UltrasoundReader(filename.replace('.wav', '.ult'), params['frame_size'])
+    fps = params['FramesPerSec']
+    total_frames = reader.total_frames
+    passed = True
+
+    if total_frames <= 2 * window_size:
+        print('{0} -- skipped, only {1} frames'.format(file_id, total_frames))
+        return True
+
+    # latency and raw activity
+    estimator = OnlineActivityEstimator(params['frame_size'], window_size, normalisation=None)
+    online, max_time, latency, errors = replay(reader, estimator, block_size)
+
+    if errors or len(online) != total_frames:
+        print('{0} -- FAIL: unexpected output count {1}'.format(file_id, errors[:3] or len(online)))
+        passed = False
+
+    if max_time > block_size / fps:
+        print('{0} -- FAIL: block took {1:.1f} ms, longer than real time ({2:.1f} ms)'\
+            .format(file_id, 1000 * max_time, 1000 * block_size / fps))
+        passed = False
+
+    batch = activity_from_file(reader, window_size)
+    error = np.abs(online[window_size:total_frames-window_size] - batch).max()
+    if error > tolerance:
+        print('{0} -- FAIL: raw activity differs from batch by {1}'.format(file_id, error))
+        passed = False
+
+    # normalised activity, against min-max over the whole utterance
+    estimator = OnlineActivityEstimator(params['frame_size'], window_size,
+        normalisation, norm_window, decay)
+    online, _, _, _ = replay(reader, estimator, block_size)
+
+    reference = compute_tongue_activity(item, window_size)[3]
+    reference = reference[int(params['TimeInSecsOfFirstFrame'] * fps):]
+    correlation = float('nan')
+    if online.std() > 0 and reference.std() > 0:
+        correlation = np.corrcoef(online, reference)[0, 1]
+
+    print('{0} -- {1}: latency {2} frames ({3:.1f} ms), block time {4:.2f} ms, raw error {5:.2g}, normalised corr {6:.4f}'\
+        .format(file_id, 'ok' if passed else 'FAIL', latency, 1000 * latency / fps,
+        1000 * max_time, error, correlation))
+    return passed
+
+
+def main(data_dir, max_files=None, block_size=4, window_size=20, normalisation='window',
+    norm_window=1200, decay=0.999):
+
+    wav_scp = os.path.join(data_dir, 'wav.scp')
+    if not os.path.isfile(wav_scp):
+        print('Could not find wav.scp in data directory')
+        sys.exit(1)
+
+    filelist = read_filelist(wav_scp)
+    if max_files:
+        filelist = filelist[:max_files]
+
+    print('Replaying {0} files in blocks of {1} frames'.format(len(filelist), block_size))
+
+    failed = 0
+    for item in filelist:
+        if not check_file(item, block_size, window_size, normalisation, norm_window, decay):
+            failed += 1
+
+    print('{0} of {1} files failed'.format(failed, len(filelist)))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('datadir',  type=str,  help='Kaldi data directory')
+    parser.add_argument('--max-files', dest='max_files', type=int, help='Replay only the first n files')
+    parser.add_argument('--block-size', dest='block_size', type=int, help='Frames per block')
+    parser.add_argument('--window-size', dest='window_size', type=int, help='Frames on each side of the ETA window')
+    parser.add_argument('--normalisation', dest='normalisation', choices=['window', 'decay'], help='Running normalisation')
+    parser.add_argument('--norm-window', dest='norm_window', type=int, help='Frames in the normalisation window')
+    parser.add_argument('--decay', dest='decay', type=float, help='Decay factor of normalisation statistics')
+    parser.set_defaults(max_files=None)
+    parser.set_defaults(block_size=4)
+    parser.set_defaults(window_size=20)
+    parser.set_defaults(normalisation='window')
+    parser.set_defaults(norm_window=1200)
+    parser.set_defaults(decay=0.999)
+    args = parser.parse_args()
+
+    main(args.datadir, args.max_files, args.block_size, args.window_size,
+        args.normalisation, args.norm_window, args.decay)
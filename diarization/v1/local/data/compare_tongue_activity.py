@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compare reduced-cost Estimated Tongue Activity (ETA) to the full computation.
+
+For each file in a Kaldi data directory, ETA is computed once in float64 over
+all pixels and once with the requested precision, pixel strides and region
+of interest. Reports correlation, maximum absolute error and speedup for each
+file and over the whole set, so that settings for make_tongue_activity.py can
+be chosen with a known accuracy cost.
+
+Date: 2026
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+from make_tongue_activity import read_filelist
+from make_tongue_activity import compute_tongue_activity
+
+from utils import read_frame_shift
+
+
+def timed(function, *args, **kwargs):
+    ''' returns tuple of (output, elapsed seconds) '''
+    start = time.time()
+    output = function(*args, **kwargs)
+    return output, time.time() - start
+
+
+def compare(reference, estimate):
+    ''' correlation and maximum absolute error between two activity arrays '''
+    if reference.size != estimate.size:
+        print('Warning: mismatched lengths {0} and {1}'.format(reference.size, estimate.size))
+        size = min(reference.size, estimate.size)
+        reference, estimate = reference[:size], estimate[:size]
+
+    error = np.abs(reference - estimate).max() if reference.size else 0.0
+    if reference.std() == 0 or estimate.std() == 0:
+        return float('nan'), error
+    return np.corrcoef(reference, estimate)[0, 1], error
+
+
+def main(data_dir, max_files=None, window_size=20, max_memory=256, frame_shift=None,
+    precision='float64', stride=(1, 1), roi=None):
+
+    wav_scp = os.path.join(data_dir, 'wav.scp')
+    if not os.path.isfile(wav_scp):
+        print('Could not find wav.scp in data directory')
+        sys.exit(1)
+
+    filelist = read_filelist(wav_scp)
+    if max_files:
+        filelist = filelist[:max_files]
+
+    print('Comparing precision={0}, stride={1}, roi={2} to float64 over all pixels'\
+        .format(precision, stride, roi))
+
+    results = []
+    total_reference, total_estimate = 0.0, 0.0
+
+    for item in filelist:
+        reference, ref_time = timed(compute_tongue_activity, item, window_size, max_memory, frame_shift)
+        estimate, est_time = timed(compute_tongue_activity, item, window_size, max_memory, frame_shift,
+            precision, stride, roi)
+
+        correlation, error = compare(reference[3], estimate[3])
+        results.append((correlation, error))
+        total_reference += ref_time
+        total_estimate  += est_time
+
+        print('{0} -- corr {1:.6f}, max error {2:.6f}, speedup {3:.2f}x'\
+            .format(item[0], correlation, error, ref_time / max(est_time, 1e-9)))
+
+    if not results:
+        print('No files to compare')
+        return
+
+    correlations = np.array([r[0] for r in results])
+    errors = np.array([r[1] for r in results])
+
+    print('Summary over {0} files:'.format(len(results)))
+    print('  correlation mean {0:.6f} min {1:.6f}'.format(np.nanmean(correlations), np.nanmin(correlations)))
+    print('  max error mean {0:.6f} max {1:.6f}'.format(errors.mean(), errors.max()))
+    print('  time {0:.2f}s vs {1:.2f}s, speedup {2:.2f}x'\
+        .format(total_reference, total_estimate, total_reference / max(total_estimate, 1e-9)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('datadir',  type=str,  help='Kaldi data directory')
+    parser.add_argument('--max-files', dest='max_files', type=int, help='Compare only the first n files')
+    parser.add_argument('--window-size', dest='window_size', type=int, help='Frames on each side of the ETA window')
+    parser.add_argument('--max-memory', dest='max_memory', type=int, help='Memory budget (MB)')
+    parser.add_argument('--mfcc-config', dest='mfcc_config', type=str, help='Compute ETA at the frame shift of this feature config')
+    parser.add_argument('--precision', dest='precision', choices=['float64', 'float32', 'int'], help='Arithmetic for window moments')
+    parser.add_argument('--scanline-stride', dest='scanline_stride', type=int, help='Use every n-th scanline')
+    parser.add_argument('--pixel-stride', dest='pixel_stride', type=int, help='Use every n-th pixel in each scanline')
+    parser.add_argument('--roi', dest='roi', type=int, nargs=4, metavar=('FIRST_SCANLINE', 'LAST_SCANLINE', 'FIRST_PIXEL', 'LAST_PIXEL'),
+        help='Region of interest (last scanline and pixel excluded)')
+    parser.set_defaults(max_files=None)
+    parser.set_defaults(window_size=20)
+    parser.set_defaults(max_memory=256)
+    parser.set_defaults(mfcc_config=None)
+    parser.set_defaults(precision='float32')
+    parser.set_defaults(scanline_stride=1)
+    parser.set_defaults(pixel_stride=1)
+    parser.set_defaults(roi=None)
+    args = parser.parse_args()
+
+    frame_shift = None
+    if args.mfcc_config:
+        frame_shift = read_frame_shift(args.mfcc_config)
+
+    main(args.datadir, args.max_files, args.window_size, args.max_memory, frame_shift,
+        args.precision, (args.scanline_stride, args.pixel_stride), args.roi)
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Convert text Estimated Tongue Activity (.tad) files to binary ETA stores.
+
+Every .tad file in the input directory is written to the output directory
+as a .eta/.idx pair with the same name (see eta_io.py).
+
+Date: 2026
+"""
+
+import os
+import argparse
+
+from eta_io import EtaWriter
+from eta_io import read_tad
+
+
+def main(input_dir, output_dir):
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    flist = sorted([f for f in os.listdir(input_dir) if f.endswith('.tad')])
+    print('Converting {0} tad files in {1}'.format(len(flist), input_dir))
+
+    for f in flist:
+        in_f  = os.path.join(input_dir, f)
+        out_f = os.path.join(output_dir, f.replace('.tad', '.eta'))
+
+        with EtaWriter(out_f) as output:
+            for file_id, offset, fps, eta in read_tad(in_f):
+                output.write(file_id, offset, fps, eta)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('input_dir',  type=str, help='input directory with .tad files')
+    parser.add_argument('output_dir', type=str, help='output directory for binary ETA')
+    args = parser.parse_args()
+
+    main(args.input_dir, args.output_dir)
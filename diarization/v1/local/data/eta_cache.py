@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Persistent on-disk cache for Estimated Tongue Activity (ETA).
+
+Entries are keyed on the identity of the input files (path, size and
+modification time, or a content hash) and on the ETA configuration, so
+that ETA is only recomputed when the ultrasound, its parameters, or the
+hyperparameters change. Each entry is a single .npz file. The cache is
+bounded in size, evicting least recently used entries first.
+
+Date: 2026
+"""
+
+import os
+import numpy as np
+
+from cache_utils import file_hash
+from cache_utils import cache_key
+from cache_utils import atomic_write
+
+
+class EtaCache(object):
+    ''' directory of cached ETA results
+        directory: cache location, shared across runs
+        max_size: maximum size of the cache in MB
+        use_hash: identify input files by content instead of path and mtime
+    '''
+
+    def __init__(self, directory, max_size=2048, use_hash=False):
+        self.directory = directory
+        self.max_size = max_size
+        self.use_hash = use_hash
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def file_identity(self, filename):
+        ''' identity of an input file '''
+        stat = os.stat(filename)
+
+        if not self.use_hash:
+            return [os.path.realpath(filename), stat.st_size, stat.st_mtime]
+
+        return [stat.st_size, file_hash(filename)]
+
+    def key(self, filenames, config):
+        ''' cache key for a list of input files and ETA configuration '''
+        identity = [self.file_identity(f) for f in filenames]
+        identity.append(sorted(config.items()))
+        return cache_key(identity)
+
+    def filename(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def get(self, key):
+        ''' cached (offset, fps, activity) for key, or None '''
+        filename = self.filename(key)
+        if not os.path.isfile(filename):
+            return None
+
+        try:
+            with np.load(filename) as data:
+                offset, fps = data['meta']
+                activity = data['activity']
+        except Exception:
+            return None
+
+        # mark as recently used
+        os.utime(filename, None)
+        return float(offset), float(fps), activity
+
+    def put(self, key, offset, fps, activity):
+        ''' add entry to the cache (see cache_utils.atomic_write) '''
+        def write(tmp_filename):
+            np.savez(tmp_filename, meta=np.array([offset, fps]), activity=activity)
+
+        atomic_write(self.filename(key), write)
+
+    def prune(self):
+        ''' evict least recently used entries until cache fits max_size
+            returns tuple of (total entries, total size in MB)
+        '''
+        entries = []
+        for f in os.listdir(self.directory):
+            if f.endswith('.npz') and not f.endswith('.tmp.npz'):
+                stat = os.stat(os.path.join(self.directory, f))
+                entries.append((stat.st_mtime, stat.st_size, f))
+
+        total_size = sum([size for _, size, _ in entries])
+        max_size = self.max_size * 1024 * 1024
+
+        # oldest first
+        entries.sort()
+        while entries and total_size > max_size:
+            _, size, f = entries.pop(0)
+            os.remove(os.path.join(self.directory, f))
+            total_size -= size
+
+        return len(entries), total_size / (1024. * 1024.)
@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Read and write Estimated Tongue Activity (ETA).
+
+Two formats are supported:
+
+tad (text)
+    one line per utterance: file_id,offset,fps,v1 v2 v3 ...
+
+eta (binary)
+    a pair of files sharing the same name:
+    name.eta : raw little-endian float32 values, one utterance after another
+               and one frame after another within each utterance
+    name.idx : text index with one line per utterance
+               file_id byte_offset num_frames offset fps [num_columns]
+               where num_columns is only given for multi-feature ETA
+
+Binary stores are read with np.memmap, so there is no float-to-text round trip
+and utterances are sliced from the mapped file without copying. Multi-feature
+ETA is read as a (num_frames, num_columns) matrix. Text files only hold a
+single column.
+
+EtaIndex maps file ids to their location in any of these files, so that the
+activity for each utterance can be read on demand.
+
+Date: 2026
+"""
+
+import os
+import numpy as np
+
+
+ETA_DTYPE = np.dtype('<f4')
+
+
+def read_complete_lines(filename, num_fields, sep=None):
+    ''' lines of a text file that were written completely
+        i.e. terminated by a newline and with the expected number of fields
+        num_fields is a single number or a tuple of allowed numbers
+    '''
+    if isinstance(num_fields, int):
+        num_fields = (num_fields,)
+
+    lines = []
+    with open(filename) as fid:
+        for line in fid:
+            if line.endswith('\n') and len(line.split(sep)) in num_fields:
+                lines.append(line)
+    return lines
+
+
+class EtaWriter(object):
+    ''' write ETA to a binary store (name.eta and name.idx)
+        each utterance is flushed to disk as soon as it is written
+        if resume is set, utterances already in the store are kept and
+        their file ids are available in file_ids
+    '''
+
+    def __init__(self, filename, resume=False):
+        base = os.path.splitext(filename)[0]
+        self.data_filename  = base + '.eta'
+        self.index_filename = base + '.idx'
+        self.file_ids = set()
+
+        if resume and os.path.isfile(self.data_filename) and os.path.isfile(self.index_filename):
+            self.recover()
+            self.data  = open(self.data_filename, 'ab')
+            self.index = open(self.index_filename, 'a')
+        else:
+            self.data  = open(self.data_filename, 'wb')
+            self.index = open(self.index_filename, 'w')
+
+    def recover(self):
+        ''' keep utterances that were written completely and drop the rest '''
+        data_size = os.path.getsize(self.data_filename)
+        lines, end = [], 0
+
+        for line in read_complete_lines(self.index_filename, (5, 6)):
+            file_id, byte_offset, num_frames, _, _, num_columns = parse_index_line(line)
+            utt_end = byte_offset + num_frames * num_columns * ETA_DTYPE.itemsize
+            if utt_end <= data_size:
+                lines.append(line)
+                end = max(end, utt_end)
+                self.file_ids.add(file_id)
+
+        with open(self.index_filename, 'w') as fid:
+            fid.writelines(lines)
+        with open(self.data_filename, 'r+b') as fid:
+            fid.truncate(end)
+
+    def write(self, file_id, offset, fps, activity):
+        ''' append activity for a single utterance
+            activity is a vector, or a (num_frames, num_columns) matrix
+        '''
+        activity = np.asarray(activity, dtype=ETA_DTYPE)
+        num_frames = activity.shape[0] if activity.ndim > 1 else activity.size
+        num_columns = activity.size // max(num_frames, 1) if activity.ndim > 1 else 1
+
+        byte_offset = self.data.tell()
+        self.data.write(np.ascontiguousarray(activity).tobytes())
+        self.data.flush()
+
+        # the index is written last, so that it never points to missing data
+        fields = [file_id, str(byte_offset), str(num_frames), str(offset), str(fps)]
+        if num_columns > 1:
+            fields.append(str(num_columns))
+        line = ' '.join(fields)
+        self.index.write(line + '\n')
+        self.index.flush()
+        self.file_ids.add(file_id)
+
+    def close(self):
+        self.data.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class TadWriter(object):
+    ''' write ETA to a text file, one line per utterance
+        each utterance is flushed to disk as soon as it is written
+        if resume is set, utterances already in the file are kept and
+        their file ids are available in file_ids
+    '''
+
+    def __init__(self, filename, resume=False):
+        self.filename = filename
+        self.file_ids = set()
+
+        if resume and os.path.isfile(filename):
+            lines = read_complete_lines(filename, 4, sep=',')
+            with open(filename, 'w') as fid:
+                fid.writelines(lines)
+            self.file_ids = set([line.split(',')[0] for line in lines])
+            self.output = open(filename, 'a')
+        else:
+            self.output = open(filename, 'w')
+
+    def write(self, file_id, offset, fps, activity):
+        ''' append activity for a single utterance '''
+        activity = np.asarray(activity)
+        if activity.ndim > 1 and activity.shape[1] > 1:
+            raise ValueError('tad files only support a single column of activity')
+        self.output.write(format_tad(file_id, offset, fps, activity) + '\n')
+        self.output.flush()
+        self.file_ids.add(file_id)
+
+    def close(self):
+        self.output.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def parse_index_line(line):
+    ''' parse a single line of a binary store index
+        returns tuple of (file_id, byte_offset, num_frames, offset, fps, num_columns)
+    '''
+    fields = line.split()
+    num_columns = int(fields[5]) if len(fields) > 5 else 1
+    file_id, byte_offset, num_frames, offset, fps = fields[:5]
+    return file_id, int(byte_offset), int(num_frames), float(offset), float(fps), num_columns
+
+
+def read_eta_index(filename):
+    ''' read index of a binary store
+        returns list of tuples (file_id, byte_offset, num_frames, offset, fps, num_columns)
+    '''
+    index = []
+    with open(filename) as fid:
+        for line in fid:
+            index.append(parse_index_line(line))
+    return index
+
+
+def slice_eta(data, byte_offset, num_frames, num_columns=1):
+    ''' activity for a single utterance from a mapped binary store '''
+    start = byte_offset // ETA_DTYPE.itemsize
+    eta = data[start:start+num_frames*num_columns]
+    if num_columns > 1:
+        eta = eta.reshape(num_frames, num_columns)
+    return eta
+
+
+class EtaIndex(object):
+    ''' index of all ETA files (.idx/.eta and .tad) in a directory
+        maps file_id to (filename, byte_offset, length, offset, fps, num_columns)
+        where length is the number of frames for binary stores
+        and the number of bytes in the line for text files
+        raises ValueError if a file id is found in both formats
+    '''
+
+    def __init__(self, directory):
+        self.entries = {}
+        self.maps = {}
+
+        for f in sorted(os.listdir(directory)):
+            filename = os.path.join(directory, f)
+            if f.endswith('.idx'):
+                self.add_eta(filename)
+            elif f.endswith('.tad'):
+                self.add_tad(filename)
+
+    def add(self, file_id, entry):
+        if file_id in self.entries:
+            previous = self.entries[file_id][0]
+
+            # the same utterance in binary and text files is most likely
+            # stale output of an earlier run, in the other format
+            if os.path.splitext(previous)[1] != os.path.splitext(entry[0])[1]:
+                raise ValueError('File id {0} found in both {1} and {2}, remove stale ETA output'\
+                    .format(file_id, previous, entry[0]))
+            print('Warning: unexpected repeated file id {0}'.format(file_id))
+        self.entries[file_id] = entry
+
+    def add_eta(self, filename):
+        ''' add all utterances in a binary store '''
+        data_filename = os.path.splitext(filename)[0] + '.eta'
+        for file_id, byte_offset, num_frames, offset, fps, num_columns in read_eta_index(filename):
+            self.add(file_id, (data_filename, byte_offset, num_frames, offset, fps, num_columns))
+
+    def add_tad(self, filename):
+        ''' add all utterances in a text file, without parsing activity '''
+        byte_offset = 0
+        with open(filename, 'rb') as fid:
+            for line in fid:
+                if line.strip():
+                    file_id, offset, fps = line.decode('utf-8').split(',', 3)[:3]
+                    self.add(file_id, (filename, byte_offset, len(line), float(offset), float(fps), 1))
+                byte_offset += len(line)
+
+    def __contains__(self, file_id):
+        return file_id in self.entries
+
+    def __getstate__(self):
+        # memory maps are reopened on demand after pickling
+        state = self.__dict__.copy()
+        state['maps'] = {}
+        return state
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, file_id):
+        ''' read activity for a single utterance
+            returns tuple of (offset, fps, tongue_activity_array)
+            where activity is a (num_frames, num_columns) matrix
+            for multi-feature ETA
+        '''
+        filename, byte_offset, length, offset, fps, num_columns = self.entries[file_id]
+
+        if filename.endswith('.tad'):
+            with open(filename, 'rb') as fid:
+                fid.seek(byte_offset)
+                line = fid.read(length).decode('utf-8')
+            return parse_tad(line)[1:]
+
+        if length == 0:
+            return offset, fps, slice_eta(np.zeros(0, dtype=ETA_DTYPE), 0, 0, num_columns)
+
+        # map each binary store once and slice utterances from it
+        if filename not in self.maps:
+            self.maps[filename] = np.memmap(filename, dtype=ETA_DTYPE, mode='r')
+        return offset, fps, slice_eta(self.maps[filename], byte_offset, length, num_columns)
+
+
+def format_tad(file_id, offset, fps, activity):
+    ''' format activity for a single utterance as a line of text '''
+    activity = ' '.join([str(v) for v in np.asarray(activity).reshape(-1,)])
+    return ','.join( [file_id, str(offset), str(fps), activity] )
+
+
+def parse_tad(line):
+    ''' parse a single line of text
+        returns tuple of (file_id, offset, fps, tongue_activity_array)
+    '''
+    file_id, offset, fps, eta = line.split(',')
+    eta = np.array(eta.split(), dtype=np.float64)
+    return file_id, float(offset), float(fps), eta
+
+
+def read_tad(filename):
+    ''' read text ETA file
+        yields tuples of (file_id, offset, fps, tongue_activity_array)
+    '''
+    with open(filename) as fid:
+        for line in fid:
+            if line.strip():
+                yield parse_tad(line)
+
+
+def acoustic_frame_positions(num_frames, offset, fps, frame_shift=0.01):
+    ''' fractional ETA sample for each of num_frames acoustic frames spaced
+        frame_shift seconds apart, for ETA starting at offset seconds
+        ETA sample i is ultrasound frame i + int(offset*fps), and positions
+        are rounded to the nearest ETA sample (np.rint) by all callers, so
+        that acoustic frames map to the same ultrasound frames everywhere
+    '''
+    times = np.arange(num_frames) * frame_shift
+    return (times - offset) * fps + int(offset * fps)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Write Kaldi feature archives directly from Python.
+
+FeatureWriter streams matrices into a Kaldi ark and builds the matching scp
+on the fly, optionally storing them in Kaldi's compressed matrix format
+(the one used by copy-feats --compress=true), so no temporary archive or
+external process is needed. By default, copy-feats only uses this format for
+matrices of more than 8 rows and stores shorter ones with two bytes per
+value. Output here matches copy-feats --compress=true --compression-method=2
+for all sizes.
+
+Kaldi compressed matrix (CM) format:
+    global header: min_value (float32), range (float32), rows, cols (int32)
+    per-column header: 0th, 25th, 75th and 100th percentiles (uint16)
+    data: one byte per value, column by column
+
+Date: 2026
+"""
+
+import struct
+
+import kaldi_io
+import numpy as np
+
+
+def uint16_to_float(min_value, value_range, value):
+    ''' inverse of float_to_uint16, as in Kaldi's CompressedMatrix '''
+    return min_value + value_range * np.float32(1.52590218966964e-05) * value.astype(np.float32)
+
+
+def float_to_uint16(min_value, value_range, value):
+    ''' map values to 16-bit integers relative to global min and range '''
+    f = np.clip((value - min_value) / value_range, 0.0, 1.0)
+    return (f * 65535 + 0.499).astype(np.int64)
+
+
+def compress_mat(mat):
+    ''' compress matrix as in Kaldi's CompressedMatrix with one byte per value
+        returns tuple of (global_header, column_headers, data) as bytes
+    '''
+    mat = np.asarray(mat, dtype=np.float32)
+    rows, cols = mat.shape
+
+    min_value = np.float32(mat.min())
+    max_value = np.float32(mat.max())
+    if max_value == min_value:
+        max_value = min_value + np.float32(1.0 + abs(min_value))
+    value_range = np.float32(max_value - min_value)
+
+    # column percentiles, kept strictly increasing
+    # with fewer than 5 rows, Kaldi takes the first 4 sorted values instead,
+    # and percentiles beyond the last row are one above the previous one
+    data = np.sort(mat, axis=0)
+    if rows >= 5:
+        quarter = rows // 4
+        indices = [0, quarter, 3*quarter, rows-1]
+    else:
+        indices = [0, 1, 2, 3]
+
+    p0, p25, p75, p100 = [float_to_uint16(min_value, value_range, data[i]) if i < rows \
+        else np.zeros(cols, dtype=np.int64) for i in indices]
+
+    p0   = np.minimum(p0, 65532)
+    p25  = np.minimum(np.maximum(p25, p0+1), 65533)
+    p75  = np.minimum(np.maximum(p75, p25+1), 65534)
+    p100 = np.maximum(p100, p75+1)
+    headers = np.stack([p0, p25, p75, p100], axis=1).astype('<u2')
+
+    # piecewise linear quantization between percentiles
+    f0, f25, f75, f100 = [uint16_to_float(min_value, value_range, p) for p in headers.T]
+
+    low  = np.clip(np.floor((mat - f0) / (f25 - f0) * 64.0 + 0.5), 0, 64)
+    mid  = np.clip(64 + np.floor((mat - f25) / (f75 - f25) * 128.0 + 0.5), 64, 192)
+    high = np.clip(192 + np.floor((mat - f75) / (f100 - f75) * 63.0 + 0.5), 192, 255)
+
+    data = np.where(mat <= f25, low, np.where(mat <= f75, mid, high)).astype(np.uint8)
+
+    global_header = struct.pack('<ffii', min_value, value_range, rows, cols)
+    return global_header, headers.tobytes(), data.T.tobytes()
+
+
+def write_compressed_mat(fd, mat):
+    ''' write matrix to binary file descriptor in Kaldi's compressed format '''
+    mat = np.asarray(mat)
+    if mat.size == 0:
+        kaldi_io.write_mat(fd, mat.astype(np.float32))
+        return
+
+    fd.write(b'\0B')
+    fd.write(b'CM ')
+    for item in compress_mat(mat):
+        fd.write(item)
+
+
+class FeatureWriter(object):
+    ''' write matrices to a Kaldi ark and its scp '''
+
+    def __init__(self, ark_filename, scp_filename, compress=True):
+        self.ark_filename = ark_filename
+        self.compress = compress
+        self.ark = open(ark_filename, 'wb')
+        self.scp = open(scp_filename, 'w')
+
+    def write(self, key, mat):
+        ''' append a single matrix to the ark and its location to the scp '''
+        self.ark.write((key + ' ').encode('utf-8'))
+        offset = self.ark.tell()
+
+        if self.compress:
+            write_compressed_mat(self.ark, mat)
+        else:
+            kaldi_io.write_mat(self.ark, np.asarray(mat, dtype=np.float32))
+
+        self.scp.write('{0} {1}:{2}\n'.format(key, self.ark_filename, offset))
+
+    def close(self):
+        self.ark.close()
+        self.scp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -3,16 +3,33 @@
 """
 Compute Estimated Tongue Activity (ETA) from ultrasound data.
 Computation is done is parallel over multiple CPU cores (using multiprocessing lib).
+A single pool is fed all files, longest ultrasound first, and results are
+appended to their output file (one per speaker, if using by_speaker) as soon
+as they are available. With resume, files already in the output are skipped.
 
 
 input: Kaldi data directory
 output: Estimated tongue activity
 max_cores: maximum number of parallel jobs
 by_speaker: estimate and save ETA by speaker identity
+window_size: number of frames on each side of the analysis window
+max_memory: memory budget for ultrasound processing per core (MB)
+output_format: binary ETA store (eta) or text (tad), see eta_io.py
+resume: keep existing output and only process missing files
+cache_dir: persistent ETA cache, shared across runs (see eta_cache.py)
+mfcc_config: compute ETA directly at the frame shift of this feature config
+precision: arithmetic for window moments (float64, float32 or int)
+scanline_stride, pixel_stride, roi: use a subset of pixels in each frame
+regions: add activity over this many sectors of consecutive scanlines
+energy: add frame-difference energy
+deltas: add deltas of all features
+manifest: take .ult and .param paths from a corpus manifest (see manifest.py)
+With regions, energy or deltas, ETA is a matrix with one column per feature,
+computed in the same pass over the ultrasound (binary eta output only).
 
 tad function:
-    input (str) : filename
-    output (str): filename,offset,fps,activity
+    input (tuple) : file_id, filename
+    output (tuple): file_id, offset, fps, activity
 
 Date: 2018
 Author: M. Sam Ribeiro
@@ -23,11 +40,29 @@ import sys
 import argparse
 import numpy as np
 
+from functools import partial
 from multiprocessing import Pool
 from multiprocessing import cpu_count
 
 from sklearn.preprocessing import MinMaxScaler
 
+from activity import UltrasoundReader
+from activity import activity_from_file
+from activity import check_precision
+from activity import select_pixels
+from activity import scanline_regions
+
+from eta_io import EtaWriter
+from eta_io import TadWriter
+from eta_io import acoustic_frame_positions
+
+from eta_cache import EtaCache
+
+from utils import read_frame_shift
+from utils import read_ultrasound_params
+
+from manifest import open_manifest
+
 # limits number of threads available to numpy
 os.environ['MKL_NUM_THREADS'] = '1'
 
@@ -60,29 +95,167 @@ def filelist_by_speaker(filelist):
     return speaker_filelist
 
 
-def write_to_file(data, filename):
-    ''' write data to filename '''
-    output = open(filename, 'w')
-    for line in data:
-        output.write(line+'\n')
-    output.close()
+def ultrasound_files(input_file_item):
+    ''' ultrasound and parameter files for an input item
+        items are (file_id, wav_path), with .ult and .param next to the waveform,
+        or (file_id, wav_path, ult_path, param_path) if taken from a manifest
+    '''
+    if len(input_file_item) > 2:
+        return input_file_item[2], input_file_item[3]
+    filename = input_file_item[1]
+    return filename.replace('.wav', '.ult'), filename.replace('.wav', '.param')
+
+
+def manifest_filelist(filelist, manifest):
+    ''' add ultrasound and parameter paths from a corpus manifest to filelist
+        files without ultrasound in the manifest are skipped
+    '''
+    items = []
+    for file_id, wav_path in filelist:
+        row = manifest.get(file_id)
+        if row is None:
+            print('Warning: {0} not found in manifest'.format(file_id))
+            items.append((file_id, wav_path))
+        elif row['ult'] is None or row['param'] is None:
+            print('Warning: no ultrasound for {0}, skipping'.format(file_id))
+        else:
+            items.append((file_id, wav_path, manifest.path(row, 'ult'), manifest.path(row, 'param')))
+    return items
+
+
+def ultrasound_size(input_file_item):
+    ''' size in bytes of the ultrasound file for an input item '''
+    ult_f = ultrasound_files(input_file_item)[0]
+    if not os.path.isfile(ult_f):
+        return 0
+    return os.path.getsize(ult_f)
+
+
+def acoustic_frame_windows(total_frames, window_size, time_offset, fps, frame_shift):
+    ''' window start for each acoustic frame, spaced frame_shift seconds apart
+        acoustic frames are mapped to the nearest ultrasound frame with
+        eta_io.acoustic_frame_positions, as in append_tongue_activity.align_activity,
+        and frames within window_size of either end use the first or last window
+        returns tuple of (window_starts, padded) where padded marks acoustic
+        frames before the first ultrasound frame
+    '''
+    total_windows = total_frames - 2*window_size
+    missing_frames = int( time_offset * fps )
+
+    # acoustic frames up to the end of the ultrasound
+    num_frames = int( (time_offset + total_frames / fps) / frame_shift )
+
+    position = acoustic_frame_positions(num_frames, time_offset, fps, frame_shift)
+    index = np.rint(position).astype(int)
+    index = np.clip(index, 0, missing_frames + total_frames - 1) - missing_frames
+
+    starts = np.clip(index - window_size, 0, total_windows - 1)
+    return starts, index < 0
+
+
+def compute_deltas(features, window=2):
+    ''' delta features by linear regression over window frames on each side,
+        repeating the first and last frames, as in Kaldi's add-deltas
+    '''
+    num_frames = features.shape[0]
+    padded = np.concatenate([features[:1]]*window + [features] + [features[-1:]]*window, axis=0)
+
+    deltas = np.zeros(features.shape)
+    for k in range(1, window+1):
+        deltas += k * (padded[window+k:window+k+num_frames] - padded[window-k:window-k+num_frames])
+    return deltas / (2 * sum([k*k for k in range(1, window+1)]))
+
+
+def num_features(regions=0, energy=False, deltas=False):
+    ''' number of ETA columns for a feature configuration '''
+    columns = 1 + regions + int(energy)
+    return 2 * columns if deltas else columns
+
+
+def open_writer(filename, output_format='eta', resume=False):
+    ''' open activity writer for filename, as binary store or text '''
+    if output_format == 'tad':
+        return TadWriter(filename, resume)
+    return EtaWriter(filename, resume)
+
+
+def remove_other_format(output_dir, key, output_format='eta'):
+    ''' remove output for key in the other format, left from an earlier run,
+        so that it is not indexed together with the new output (see EtaIndex)
+    '''
+    extensions = ['.tad'] if output_format == 'eta' else ['.eta', '.idx']
+    for extension in extensions:
+        filename = os.path.join(output_dir, key + extension)
+        if os.path.isfile(filename):
+            print('Removing {0}, written in another format'.format(filename))
+            os.remove(filename)
 
 
 
-def estimate_tongue_activity(input_file_item):
+def estimate_tongue_activity(input_file_item, window_size=20, max_memory=256, frame_shift=None,
+    precision='float64', stride=(1, 1), roi=None, regions=0, energy=False, deltas=False, cache=None):
     ''' 
         Single pickable function to estimate tongue activity.
-        To be used with multiprocessing.Pool.
-        Assumes filename is .wav and that .ult and .param are in the same directory
-        Cannot handle segments or other hyperparameter inputs
+        To be used with multiprocessing.Pool (via functools.partial).
+        Assumes filename is .wav and that .ult and .param are in the same directory,
+        unless their paths are given in the item (see ultrasound_files)
+        Cannot handle segments
+
+        window_size: frames on each side of the window over which to compute
+        tongue activity. Each frame is ~1000/120 msecs, so the
+        default 20 frames is ~166 msecs
+        max_memory: memory budget in MB. The ultrasound file is
+        memory-mapped and processed in chunks that fit this budget
+        frame_shift: if set, activity is only evaluated at acoustic frames
+        spaced frame_shift seconds apart, starting at time zero. The output
+        then has zero offset and 1/frame_shift fps
+        precision: float64, float32, or int arithmetic for window moments
+        stride: use every n-th scanline and every m-th pixel, as (n, m)
+        roi: region of interest, as (first_scanline, last_scanline,
+        first_pixel, last_pixel). Uses the full frame if not set
+        regions: number of sectors of consecutive scanlines, each adding
+        a column with activity over its pixels
+        energy: add a column with frame-difference energy
+        deltas: add delta columns for all of the above
+        cache: EtaCache object. Results are taken from the cache if the
+        input files and configuration have not changed
     '''
 
-    file_id, filename = input_file_item
+    file_id = input_file_item[0]
 
-    # window over which to compute tongue activity
-    # each frame is ~1000/120 msecs
-    # default 20 frames is ~166 msecs
-    window_size=20
+    args = (input_file_item, window_size, max_memory, frame_shift, precision, stride, roi,
+        regions, energy, deltas)
+
+    if not cache:
+        return compute_tongue_activity(*args)
+
+    # all hyperparameters that change the output
+    config = {'window_size': window_size, 'scaler': 'minmax', 'frame_shift': frame_shift,
+        'precision': precision, 'stride': tuple(stride), 'roi': roi and tuple(roi),
+        'regions': regions, 'energy': energy, 'deltas': deltas}
+
+    # acoustic frames are mapped to ultrasound frames as in align_activity,
+    # so that results cached with the earlier mapping are not reused
+    if frame_shift:
+        config['frame_mapping'] = 'acoustic_frame_positions'
+
+    ult_f, prm_f = ultrasound_files(input_file_item)
+    key = cache.key([ult_f, prm_f], config)
+
+    cached = cache.get(key)
+    if cached is not None:
+        return (file_id,) + cached
+
+    output = compute_tongue_activity(*args)
+    cache.put(key, *output[1:])
+    return output
+
+
+def compute_tongue_activity(input_file_item, window_size=20, max_memory=256, frame_shift=None,
+    precision='float64', stride=(1, 1), roi=None, regions=0, energy=False, deltas=False):
+    ''' compute tongue activity, see estimate_tongue_activity '''
+
+    file_id = input_file_item[0]
 
     # scaler object for unity based normalization
     # use None for no normalization
@@ -90,46 +263,75 @@ def estimate_tongue_activity(input_file_item):
     #scaler_obj = None
 
     # read ultrasound and parameters from files
-    ult_f   = filename.replace('.wav', '.ult')
-    prm_f = filename.replace('.wav', '.param')
+    ult_f, prm_f = ultrasound_files(input_file_item)
 
-    params = {}
-    with open(prm_f) as param_id:
-        for line in param_id:
-            name, var = line.partition("=")[::2]
-            params[name.strip()] = float(var)
+    params = read_ultrasound_params(prm_f)
+    frame_size = params['frame_size']
 
-    fid = open(ult_f, "r")
-    ultrasound = np.fromfile(fid, dtype=np.uint8)
-    fid.close()
+    ultrasound = UltrasoundReader(ult_f, frame_size)
 
-    frame_size = int( params['NumVectors'] * params['PixPerVector'] )
-    params['frame_size'] = frame_size
+    # subset of pixels, if requested
+    pixels = None
+    if roi or tuple(stride) != (1, 1):
+        pixels = select_pixels(int(params['NumVectors']), int(params['PixPerVector']),
+            stride[0], stride[1], roi)
 
-    n_frames =  int( ultrasound.size / frame_size )
-    ultrasound = ultrasound.reshape((n_frames, frame_size))
+    # frame columns in each region, if requested
+    region_columns = None
+    if regions:
+        region_columns = scanline_regions(int(params['NumVectors']), int(params['PixPerVector']),
+            regions, pixels)
 
-    # get tongue activity from ultrasound
-    activity = []
-    total_frames, frame_size = ultrasound.shape
+    # empty output, with one column per feature
+    columns = num_features(regions, energy, deltas)
+    empty = np.zeros(1) if columns == 1 else np.zeros((1, columns))
 
-    if total_frames == 0:
+    # get tongue activity from ultrasound
+    if ultrasound.total_frames == 0:
         print('Warning: empty ultrasound for {0}'.format(file_id))
-        return ','.join([file_id, str(0.0), str(0.0), str(0.0)])
+        return (file_id, 0.0, 0.0, empty)
+
+    time_offset = params['TimeInSecsOfFirstFrame']
+    fps = params['FramesPerSec']
 
-    for i in range(window_size, total_frames-window_size):
-        segment = ultrasound[i-window_size:i+window_size, :]
-        std = np.std(segment, axis=0).reshape(-1, 1)
-        dst = np.mean(std, axis=0)[0]
-        activity.append(dst)
+    if frame_shift:
+        if ultrasound.total_frames <= 2*window_size:
+            print('Warning: no activity for {0}'.format(file_id))
+            return (file_id, 0.0, 0.0, empty)
+
+        # only evaluate windows used by acoustic frames
+        starts, padded = acoustic_frame_windows(ultrasound.total_frames,
+            window_size, time_offset, fps, frame_shift)
+        windows, inverse = np.unique(starts, return_inverse=True)
+        activity = activity_from_file(ultrasound, window_size, max_memory*1024*1024,
+            windows, precision, pixels, region_columns, energy)
+        act = activity[inverse.reshape(-1,)].reshape(len(starts), -1)
+
+        # normalise over evaluated frames, and pad with zeros
+        # before the first ultrasound frame
+        if scaler_obj and not padded.all():
+            act[~padded] = scaler_obj.fit_transform(act[~padded])
+        act[padded] = 0.0
+
+        if deltas:
+            act = np.concatenate([act, compute_deltas(act)], axis=1)
+
+        if columns == 1:
+            act = act.reshape(-1,)
+        return (file_id, 0.0, 1.0 / frame_shift, act)
+
+    # mean over pixels of the per-pixel std in each sliding window
+    activity = activity_from_file(ultrasound, window_size, max_memory*1024*1024,
+        precision=precision, pixels=pixels, regions=region_columns, energy=energy)
+    activity = list(activity)
 
     if len(activity) == 0:
         print('Warning: no activity for {0}'.format(file_id))
-        return ','.join([file_id, str(0.0), str(0.0), str(0.0)])
+        return (file_id, 0.0, 0.0, empty)
 
     # pad activity to account for window shift
     activity = [activity[0]]*window_size + activity + [activity[-1]]*window_size
-    activity = np.array(activity).reshape(-1, 1)
+    activity = np.array(activity).reshape(len(activity), -1)
 
     if scaler_obj:
         activity = scaler_obj.fit_transform(activity)
@@ -137,22 +339,33 @@ def estimate_tongue_activity(input_file_item):
     act = activity
 
     # pad according to audio time offset
-    time_offset = params['TimeInSecsOfFirstFrame']
-    fps = params['FramesPerSec']
-
     missing_frames = int( time_offset * fps )
-    pad = np.zeros((missing_frames, 1))
+    pad = np.zeros((missing_frames, act.shape[1]))
     act = np.concatenate([pad, act], axis=0)
 
-    # output format
-    activity = ' '.join([str(v) for v in act.reshape(-1,)])
-    output = ','.join( [file_id, str(time_offset), str(fps), activity] )
+    if deltas:
+        act = np.concatenate([act, compute_deltas(act)], axis=1)
 
-    return output
+    if columns == 1:
+        act = act.reshape(-1,)
+    return (file_id, time_offset, fps, act)
 
 
 
-def main(data_dir, output_dir, max_cores, by_speaker=False):
+def main(data_dir, output_dir, max_cores, by_speaker=False, window_size=20, max_memory=256,
+    output_format='eta', resume=False, cache_dir=None, cache_size=2048, cache_hash=False, frame_shift=None,
+    precision='float64', stride=(1, 1), roi=None, regions=0, energy=False, deltas=False,
+    manifest_filename=None):
+
+    if output_format == 'tad' and num_features(regions, energy, deltas) > 1:
+        print('Multiple ETA features are only supported with binary (eta) output')
+        sys.exit(1)
+
+    try:
+        check_precision(window_size, precision)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
 
     # find wav.scp
     wav_scp = os.path.join(data_dir, 'wav.scp')
@@ -166,31 +379,73 @@ def main(data_dir, output_dir, max_cores, by_speaker=False):
     # read waveform list
     filelist = read_filelist(wav_scp)
 
+    # take ultrasound paths from the corpus manifest
+    if manifest_filename:
+        with open_manifest(manifest_filename) as manifest:
+            filelist = manifest_filelist(filelist, manifest)
+
     # break larger filelist by speaker
     # this will cause activity to be saved separately for each speaker
     # it is useful if using a large number of files
     if by_speaker:
-        filelist = filelist_by_speaker(filelist)
+        output_filelist = filelist_by_speaker(filelist)
     else:
-        filelist = {'tad':filelist}
-
-    # available cpu cores
-    cpu_cores = cpu_count()
-
-    for key in filelist:
-
-        data = filelist[key]
-        # use the minimum over maximum requested cores,
-        # available cores, or number of files
-        cores = min([max_cores, len(data), cpu_cores])
-        print('Estimating tongue activity for {0}: {1} files over {2} cores'.format(key, len(data), cores))
-
+        output_filelist = {'tad':filelist}
+
+    # output key for each file id
+    output_keys = {}
+    for key in output_filelist:
+        for item in output_filelist[key]:
+            output_keys[item[0]] = key
+
+    # open outputs, keeping what was already written if resuming
+    writers = {}
+    for key in output_filelist:
+        output_filename = os.path.join(output_dir, key + '.' + output_format)
+        if not resume:
+            remove_other_format(output_dir, key, output_format)
+        writers[key] = open_writer(output_filename, output_format, resume)
+
+    if resume:
+        done = set()
+        for key in writers:
+            done.update(writers[key].file_ids)
+        total_files = len(filelist)
+        filelist = [f for f in filelist if f[0] not in done]
+        print('Resuming: skipping {0} files already processed'.format(total_files-len(filelist)))
+
+    # longest files first, so that no core is left
+    # waiting on a long file at the end
+    filelist = sorted(filelist, key=ultrasound_size, reverse=True)
+
+    # use the minimum over maximum requested cores,
+    # available cores, or number of files
+    cores = max(min([max_cores, len(filelist), cpu_count()]), 1)
+    print('Estimating tongue activity for {0} files in {1} outputs over {2} cores'\
+        .format(len(filelist), len(output_filelist), cores))
+
+    cache = None
+    if cache_dir:
+        cache = EtaCache(cache_dir, cache_size, cache_hash)
+
+    estimate = partial(estimate_tongue_activity, window_size=window_size,
+        max_memory=max_memory, frame_shift=frame_shift, precision=precision,
+        stride=stride, roi=roi, regions=regions, energy=energy, deltas=deltas, cache=cache)
+
+    # write each file as soon as it is done
+    if filelist:
         pool = Pool(processes=cores)
-        tad_data = pool.map(estimate_tongue_activity, data)
+        for item in pool.imap_unordered(estimate, filelist):
+            writers[output_keys[item[0]]].write(*item)
         pool.close()
+        pool.join()
+
+    for key in writers:
+        writers[key].close()
 
-        output_filename = os.path.join(output_dir, key + '.tad')
-        write_to_file(tad_data, output_filename)
+    if cache:
+        entries, size = cache.prune()
+        print('ETA cache: {0} entries, {1:.1f} MB'.format(entries, size))
 
 
 if __name__ == "__main__":
@@ -199,8 +454,49 @@ if __name__ == "__main__":
     parser.add_argument('outputdir',  type=str,  help='Output directory')
     parser.add_argument('--max-cores',  dest='max_cores', type=int,  help='Maximum number of CPU cores')
     parser.add_argument('--by-speaker', dest='by_speaker', action='store_true', help='Process data by speaker ID')
+    parser.add_argument('--window-size', dest='window_size', type=int, help='Frames on each side of the ETA window')
+    parser.add_argument('--max-memory', dest='max_memory', type=int, help='Memory budget per CPU core (MB)')
+    parser.add_argument('--format', dest='output_format', choices=['eta', 'tad'], help='Binary (eta) or text (tad) output')
+    parser.add_argument('--resume', dest='resume', action='store_true', help='Skip files already in the output')
+    parser.add_argument('--cache-dir', dest='cache_dir', type=str, help='Persistent ETA cache directory')
+    parser.add_argument('--cache-size', dest='cache_size', type=int, help='Maximum size of ETA cache (MB)')
+    parser.add_argument('--cache-hash', dest='cache_hash', action='store_true', help='Identify inputs in cache by content hash')
+    parser.add_argument('--mfcc-config', dest='mfcc_config', type=str, help='Compute ETA at the frame shift of this feature config')
+    parser.add_argument('--precision', dest='precision', choices=['float64', 'float32', 'int'], help='Arithmetic for window moments')
+    parser.add_argument('--scanline-stride', dest='scanline_stride', type=int, help='Use every n-th scanline')
+    parser.add_argument('--pixel-stride', dest='pixel_stride', type=int, help='Use every n-th pixel in each scanline')
+    parser.add_argument('--roi', dest='roi', type=int, nargs=4, metavar=('FIRST_SCANLINE', 'LAST_SCANLINE', 'FIRST_PIXEL', 'LAST_PIXEL'),
+        help='Region of interest (last scanline and pixel excluded)')
+    parser.add_argument('--regions', dest='regions', type=int, help='Add activity over this many sectors of scanlines')
+    parser.add_argument('--energy', dest='energy', action='store_true', help='Add frame-difference energy')
+    parser.add_argument('--deltas', dest='deltas', action='store_true', help='Add deltas of all features')
+    parser.add_argument('--manifest', dest='manifest', type=str, help='Corpus manifest with ultrasound paths (see manifest.py)')
     parser.set_defaults(max_cores=20)
     parser.set_defaults(by_speaker=False)
+    parser.set_defaults(window_size=20)
+    parser.set_defaults(max_memory=256)
+    parser.set_defaults(output_format='eta')
+    parser.set_defaults(resume=False)
+    parser.set_defaults(cache_dir=None)
+    parser.set_defaults(cache_size=2048)
+    parser.set_defaults(cache_hash=False)
+    parser.set_defaults(mfcc_config=None)
+    parser.set_defaults(precision='float64')
+    parser.set_defaults(scanline_stride=1)
+    parser.set_defaults(pixel_stride=1)
+    parser.set_defaults(roi=None)
+    parser.set_defaults(regions=0)
+    parser.set_defaults(energy=False)
+    parser.set_defaults(deltas=False)
+    parser.set_defaults(manifest=None)
     args = parser.parse_args()
 
-    main(args.datadir, args.outputdir, args.max_cores, args.by_speaker)
+    frame_shift = None
+    if args.mfcc_config:
+        frame_shift = read_frame_shift(args.mfcc_config)
+
+    main(args.datadir, args.outputdir, args.max_cores, args.by_speaker,
+        args.window_size, args.max_memory, args.output_format, args.resume,
+        args.cache_dir, args.cache_size, args.cache_hash, frame_shift,
+        args.precision, (args.scanline_stride, args.pixel_stride), args.roi,
+        args.regions, args.energy, args.deltas, args.manifest)
@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Persistent manifest of an UltraSuite corpus (SQLite).
+
+The manifest is built once per corpus root (e.g. core-uxtd) and records, for
+every waveform under core/, its speaker, session, file id, the paths to its
+.wav, .ult, .param and prompt .txt files, the prompt text, the waveform
+duration (as in utt2dur), the number of ultrasound frames, and the ultrasound
+frame rate and time offset.
+
+Corpus layouts:
+    core/SPEAKER/NAME.wav           (UXTD, file id SPEAKER-NAME)
+    core/SPEAKER/SESSION/NAME.wav   (UXSSD/UPX, file id SPEAKER-SESSION-NAME)
+
+Paths are stored relative to the corpus root. A manifest belongs to the
+corpus root it was built for, and opening it for a different root is an
+error. Use CorpusManifest.path for absolute paths.
+
+Updates are incremental: a file is only probed again if the modification time
+of any of its files changes, or if companion files appear or disappear.
+Data preparation and ETA scripts can then query the manifest instead of
+walking the corpus and probing every file.
+
+usage: manifest.py corpus_dir manifest_filename
+
+Date: 2026
+"""
+
+import os
+import sys
+import sqlite3
+import argparse
+
+from functools import partial
+from multiprocessing.pool import ThreadPool
+
+from utils import get_duration
+from utils import read_ultrasound_params
+
+
+COLUMNS = ['file_id', 'speaker', 'session', 'name', 'wav', 'ult', 'param', 'txt', 'prompt',
+    'duration', 'ult_frames', 'fps', 'offset', 'mtime']
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    file_id TEXT PRIMARY KEY,
+    speaker TEXT,
+    session TEXT,
+    name TEXT,
+    wav TEXT,
+    ult TEXT,
+    param TEXT,
+    txt TEXT,
+    prompt TEXT,
+    duration REAL,
+    ult_frames INTEGER,
+    fps REAL,
+    offset REAL,
+    mtime REAL
+);
+CREATE INDEX IF NOT EXISTS files_speaker ON files (speaker, session);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+'''
+
+
+def find_waveforms(corpus_dir):
+    ''' walk corpus layout
+        returns list of tuples (file_id, speaker, session, name, wav_path)
+        where wav_path is relative to corpus_dir
+    '''
+    datadir = os.path.join(corpus_dir, 'core')
+    waveforms = []
+
+    for speaker in sorted(os.listdir(datadir)):
+        speaker_dir = os.path.join(datadir, speaker)
+        if not os.path.isdir(speaker_dir):
+            continue
+
+        for f in sorted(os.listdir(speaker_dir)):
+
+            if f.endswith('.wav'):
+                name = f.replace('.wav', '')
+                path = os.path.join('core', speaker, f)
+                waveforms.append(('-'.join([speaker, name]), speaker, None, name, path))
+
+            elif os.path.isdir(os.path.join(speaker_dir, f)):
+                for g in sorted(os.listdir(os.path.join(speaker_dir, f))):
+                    if g.endswith('.wav'):
+                        name = g.replace('.wav', '')
+                        path = os.path.join('core', speaker, f, g)
+                        waveforms.append(('-'.join([speaker, f, name]), speaker, f, name, path))
+
+    return waveforms
+
+
+def companion_files(corpus_dir, wav_path):
+    ''' ultrasound, parameter and prompt files for a waveform, or None if missing
+        paths are relative to corpus_dir
+    '''
+    files = []
+    for ext in ['.ult', '.param', '.txt']:
+        path = wav_path.replace('.wav', ext)
+        files.append(path if os.path.isfile(os.path.join(corpus_dir, path)) else None)
+    return files
+
+
+def modification_time(corpus_dir, paths):
+    ''' latest modification time over existing paths '''
+    return max([os.path.getmtime(os.path.join(corpus_dir, p)) for p in paths if p])
+
+
+def probe(item, corpus_dir):
+    ''' read everything the manifest records about a single waveform
+        returns a row, with values in the order of COLUMNS
+    '''
+    file_id, speaker, session, name, wav = item
+    ult, param, txt = companion_files(corpus_dir, wav)
+
+    prompt = None
+    if txt:
+        with open(os.path.join(corpus_dir, txt), 'r') as fid:
+            prompt = fid.readline().rstrip()
+
+    ult_frames, fps, offset = 0, None, None
+    if param:
+        params = read_ultrasound_params(os.path.join(corpus_dir, param))
+        fps = params['FramesPerSec']
+        offset = params['TimeInSecsOfFirstFrame']
+        if ult and params['frame_size'] > 0:
+            ult_frames = os.path.getsize(os.path.join(corpus_dir, ult)) // params['frame_size']
+
+    duration = get_duration(os.path.join(corpus_dir, wav))
+    mtime = modification_time(corpus_dir, [wav, ult, param, txt])
+
+    return (file_id, speaker, session, name, wav, ult, param, txt, prompt,
+        duration, ult_frames, fps, offset, mtime)
+
+
+class CorpusManifest(object):
+    ''' SQLite manifest of an UltraSuite corpus
+        filename: manifest database, created if it does not exist
+        corpus_dir: corpus root. Taken from the manifest if not set, and must
+        match the corpus root the manifest was built for otherwise
+    '''
+
+    def __init__(self, filename, corpus_dir=None):
+        directory = os.path.dirname(filename)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.filename = filename
+        self.db = sqlite3.connect(filename)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+
+        stored = self.db.execute("SELECT value FROM meta WHERE key = 'corpus_dir'").fetchone()
+        if corpus_dir is None and stored is None:
+            raise ValueError('No corpus directory for manifest {0}'.format(filename))
+
+        if stored is None:
+            # new manifest
+            self.corpus_dir = os.path.abspath(corpus_dir)
+            self.write_meta()
+        elif corpus_dir is not None and stored['value'] != os.path.abspath(corpus_dir):
+            raise ValueError('Manifest {0} was built for {1}, not {2}'\
+                .format(filename, stored['value'], os.path.abspath(corpus_dir)))
+        else:
+            self.corpus_dir = stored['value']
+
+    def write_meta(self):
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES ('corpus_dir', ?)", (self.corpus_dir,))
+        self.db.commit()
+
+    def update(self, num_threads=16):
+        ''' add new or modified files and remove deleted ones
+            returns tuple of (total files, updated files, removed files)
+        '''
+        waveforms = find_waveforms(self.corpus_dir)
+
+        stored = {}
+        for row in self.db.execute('SELECT file_id, ult, param, txt, mtime FROM files'):
+            stored[row['file_id']] = (row['ult'], row['param'], row['txt'], row['mtime'])
+
+        # only probe files that are new or changed
+        changed = []
+        for item in waveforms:
+            files = companion_files(self.corpus_dir, item[4])
+            current = tuple(files) + (modification_time(self.corpus_dir, [item[4]] + files),)
+            if stored.get(item[0]) != current:
+                changed.append(item)
+
+        if changed:
+            pool = ThreadPool(max(min(num_threads, len(changed)), 1))
+            rows = pool.map(partial(probe, corpus_dir=self.corpus_dir), changed)
+            pool.close()
+
+            placeholders = ', '.join(['?'] * len(COLUMNS))
+            self.db.executemany('INSERT OR REPLACE INTO files VALUES ({0})'.format(placeholders), rows)
+
+        found = set([item[0] for item in waveforms])
+        removed = [(file_id,) for file_id in stored if file_id not in found]
+        self.db.executemany('DELETE FROM files WHERE file_id = ?', removed)
+        self.write_meta()
+
+        return len(waveforms), len(changed), len(removed)
+
+    def files(self, speaker=None, session=None):
+        ''' rows for all files, or those of a speaker and session, ordered by file id '''
+        query, args = 'SELECT * FROM files', []
+        conditions = []
+        if speaker is not None:
+            conditions.append('speaker = ?')
+            args.append(speaker)
+        if session is not None:
+            conditions.append('session = ?')
+            args.append(session)
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        return self.db.execute(query + ' ORDER BY file_id', args).fetchall()
+
+    def path(self, row, column='wav', corpus_dir=None):
+        ''' absolute path to one of the files of a row (wav, ult, param or txt),
+            or None if missing. Relative to corpus_dir, if set
+        '''
+        if row[column] is None:
+            return None
+        return os.path.join(corpus_dir or self.corpus_dir, row[column])
+
+    def get(self, file_id):
+        ''' row for a single file id, or None '''
+        return self.db.execute('SELECT * FROM files WHERE file_id = ?', (file_id,)).fetchone()
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def open_manifest(filename, corpus_dir=None):
+    ''' open an existing manifest, or return None if filename is not set '''
+    if not filename:
+        return None
+    if not os.path.isfile(filename):
+        print('Could not find manifest {0}, build it with manifest.py'.format(filename))
+        sys.exit(1)
+    return CorpusManifest(filename, corpus_dir)
+
+
+def main(corpus_dir, manifest_filename, num_threads=16):
+    with CorpusManifest(manifest_filename, corpus_dir) as manifest:
+        total, updated, removed = manifest.update(num_threads)
+    print('Manifest for {0}: {1} files, {2} added or updated, {3} removed'\
+        .format(corpus_dir, total, updated, removed))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('corpus_dir', type=str, help='path to UltraSuite corpus (e.g. core-uxtd)')
+    parser.add_argument('manifest', type=str, help='manifest database, created or updated')
+    parser.add_argument('--num-threads', dest='num_threads', type=int, help='threads for probing files')
+    parser.set_defaults(num_threads=16)
+    args = parser.parse_args()
+
+    main(args.corpus_dir, args.manifest, args.num_threads)
@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Prepare Kaldi data directories for UXTD, UXSSD and UPX.
+
+A single walk over a corpus (or a query of its manifest, see manifest.py)
+gives every utterance. Corpus rules then select the utterances for each
+requested data directory:
+
+train: UXTD only, one directory per subset in doc/speakers. Utterances of
+    types D (articulatory), E (non-speech) and F (other) are skipped, and text
+    is taken from the label transcriptions as SLT/CHILD tokens
+decode: all utterances, with prompts as text (ignored for decoding)
+reference: decode restricted to utterances with reference speaker labels
+
+Per-file I/O (prompts, transcriptions and durations) is done once per
+utterance with a pool of threads, and all requested directories (text,
+wav.scp, utt2spk, spk2utt and utt2dur) are written from the same walk.
+
+corpus rules:
+    layout: speaker (core/SPEAKER/NAME.wav) or session (core/SPEAKER/SESSION/NAME.wav)
+    speaker_map: only use speakers listed in doc/speakers
+    reject: utterances with issues, always ignored
+
+Date: 2026
+"""
+
+import os
+import sys
+import argparse
+
+from multiprocessing.pool import ThreadPool
+
+from utils import write_data
+from utils import get_duration
+from utils import read_speaker_map
+
+from manifest import open_manifest
+from manifest import find_waveforms
+
+
+# UXSSD/UPX utterances with issues, ignore these
+SESSION_REJECT_LIST = ['02F-Therapy_07-004A', '20M-BL2-009A']
+
+CORPORA = {
+    'uxtd':  {'layout': 'speaker', 'speaker_map': True,  'reject': []},
+    'uxssd': {'layout': 'session', 'speaker_map': False, 'reject': SESSION_REJECT_LIST},
+    'upx':   {'layout': 'session', 'speaker_map': False, 'reject': SESSION_REJECT_LIST},
+}
+
+# skip utterances of types D (articulatory), E (non-speech), and F (other)
+TRAIN_SKIP_TASKS = ('D', 'E', 'F')
+
+
+def find_utterances(corpus_dir, rules, manifest=None, speakers=None):
+    ''' all utterances in a corpus that follow its rules, from a single walk
+        or from the manifest if set
+        returns list of dicts with file_id, speaker, name, wav and txt paths,
+        and prompt and duration if known from the manifest
+    '''
+    if manifest:
+        items = [(row['file_id'], row['speaker'], row['session'], row['name'], row['wav'],
+            row['prompt'], row['duration']) for row in manifest.files()]
+    else:
+        items = [item + (None, None) for item in find_waveforms(corpus_dir)]
+
+    utterances = []
+    for file_id, speaker, session, name, wav, prompt, duration in items:
+
+        # layout of the corpus
+        if (session is None) != (rules['layout'] == 'speaker'):
+            continue
+        if file_id in rules['reject']:
+            continue
+        if speakers is not None and speaker not in speakers:
+            continue
+
+        wav_path = os.path.join(corpus_dir, wav)
+        utterances.append({'file_id': file_id, 'speaker': speaker, 'name': name,
+            'wav': wav_path, 'txt': wav_path.replace('.wav', '.txt'),
+            'prompt': prompt, 'duration': duration})
+
+    return utterances
+
+
+def read_line(filename):
+    ''' first line of a text file '''
+    with open(filename, 'r') as fid:
+        return fid.readline().rstrip()
+
+
+def probe_utterance(utt, transdir=None, prompt=False):
+    ''' read duration, and prompt and transcription if requested,
+        for a single utterance, unless already known
+    '''
+    if prompt and utt['prompt'] is None:
+        utt['prompt'] = read_line(utt['txt'])
+    if utt['duration'] is None:
+        utt['duration'] = get_duration(utt['wav'])
+    if transdir:
+        utt['transcription'] = read_line(os.path.join(transdir, utt['file_id']+'.txt'))
+    return utt
+
+
+def prompt_text(utt):
+    ''' use prompt for text, although it will be ignored for decoding '''
+    words = [w.upper() for w in utt['prompt'].split()]
+    return ' '.join([utt['file_id']] + words)
+
+
+def transcription_text(utt):
+    ''' read transcription and convert to SLT/CHILD tokens '''
+    words = []
+    for w in utt['transcription'].split():
+        w = w.upper()
+        w = 'SLT' if 'SLT' in w else 'CHILD'
+        words.append(w)
+    return ' '.join([utt['file_id']] + words)
+
+
+def write_data_dir(output_dir, utterances, text_function, sample_rate=16000):
+    ''' write text, wav.scp, utt2spk, spk2utt and utt2dur and validate directory '''
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    wav_base = 'FILEID sox WAVPATH -r {0} -t .wav - |'.format(sample_rate)
+
+    speaker_utts = {}
+    text, wav = [], []
+    utt2spk, spk2utt = [], []
+    utt2dur = []
+
+    for utt in utterances:
+        fileid, speaker = utt['file_id'], utt['speaker']
+
+        text.append(text_function(utt))
+
+        file_wav = wav_base.replace('FILEID', fileid)
+        file_wav = file_wav.replace('WAVPATH', utt['wav'])
+        wav.append(file_wav)
+
+        utt2dur.append('{0} {1}'.format(fileid, utt['duration']))
+        utt2spk.append('{0} {1}'.format(fileid, speaker))
+
+        if speaker in speaker_utts:
+            speaker_utts[speaker].add(fileid)
+        else:
+            speaker_utts[speaker] = set([fileid])
+
+    for speaker in speaker_utts:
+        spk_utts = '{0} {1}'.format(speaker, ' '.join(sorted(speaker_utts[speaker])))
+        spk2utt.append(spk_utts)
+
+    write_data(text, os.path.join(output_dir, 'text'))
+    write_data(wav, os.path.join(output_dir, 'wav.scp'))
+    write_data(utt2spk, os.path.join(output_dir, 'utt2spk'))
+    write_data(spk2utt, os.path.join(output_dir, 'spk2utt'))
+    write_data(utt2dur, os.path.join(output_dir, 'utt2dur'))
+
+    # validate data directory
+    validate_cmd = './utils/validate_data_dir.sh --no-feats {0}'.format(output_dir)
+    os.system(validate_cmd)
+
+
+def main(corpus, corpus_dir, labels_dir, train_dir=None, decode_dir=None, reference_dir=None,
+    sample_rate=16000, manifest_filename=None, num_threads=16):
+
+    rules = CORPORA[corpus]
+
+    if train_dir and not rules['speaker_map']:
+        print('Training data can only be prepared for corpora with a speaker map')
+        sys.exit(1)
+
+    # corpus manifest, queried instead of walking the corpus
+    manifest = open_manifest(manifest_filename, corpus_dir)
+
+    speaker_map = None
+    speakers = None
+    if rules['speaker_map']:
+        speaker_map = read_speaker_map(os.path.join(corpus_dir, 'doc', 'speakers'))
+        speakers = set([s for subset in speaker_map for s in speaker_map[subset]])
+
+    utterances = find_utterances(corpus_dir, rules, manifest, speakers)
+    print('Found {0} {1} utterances in {2}'.format(len(utterances), corpus, corpus_dir))
+
+    # utterances for each output directory
+    outputs = []
+
+    if train_dir:
+        transdir = os.path.join(labels_dir, 'transcriptions')
+        for subset in speaker_map:
+            subset_speakers = set(speaker_map[subset])
+            subset_utts = [u for u in utterances if u['speaker'] in subset_speakers \
+                and not u['name'].endswith(TRAIN_SKIP_TASKS)]
+            outputs.append((os.path.join(train_dir, subset), subset_utts, transcription_text))
+            for utt in subset_utts:
+                utt['transdir'] = transdir
+
+    if decode_dir:
+        outputs.append((decode_dir, utterances, prompt_text))
+
+    if reference_dir:
+        ref_dir = os.path.join(labels_dir, 'reference_labels', 'speaker_labels', 'lab')
+        reference_list = set([f.replace('.lab', '') for f in os.listdir(ref_dir)])
+        reference_utts = [u for u in utterances if u['file_id'] in reference_list]
+        outputs.append((reference_dir, reference_utts, prompt_text))
+
+    # per-file I/O, once for each utterance used by any output,
+    # prompts are only read for outputs that use them
+    used = {}
+    for _, utts, text_function in outputs:
+        for utt in utts:
+            used[utt['file_id']] = utt
+            if text_function is prompt_text:
+                utt['use_prompt'] = True
+
+    pool = ThreadPool(max(min(num_threads, len(used)), 1))
+    pool.map(lambda utt: probe_utterance(utt, utt.get('transdir'), utt.get('use_prompt', False)),
+        list(used.values()))
+    pool.close()
+
+    for output_dir, utts, text_function in outputs:
+        print('Writing {0} utterances to {1}'.format(len(utts), output_dir))
+        write_data_dir(output_dir, utts, text_function, sample_rate)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('corpus', choices=sorted(CORPORA), help='corpus rules')
+    parser.add_argument('corpus_dir', type=str, help='path to corpus')
+    parser.add_argument('labels_dir', type=str, help='path to corpus label directory')
+    parser.add_argument('--train', dest='train_dir', type=str, help='output directory for training data (one per subset)')
+    parser.add_argument('--decode', dest='decode_dir', type=str, help='output directory for all utterances')
+    parser.add_argument('--reference', dest='reference_dir', type=str, help='output directory for reference utterances')
+    parser.add_argument('--sr', dest='sample_rate', type=int, help='sample rate in Hz')
+    parser.add_argument('--manifest', dest='manifest', type=str, help='corpus manifest (see manifest.py)')
+    parser.add_argument('--num-threads', dest='num_threads', type=int, help='threads for per-file I/O')
+    parser.set_defaults(train_dir=None)
+    parser.set_defaults(decode_dir=None)
+    parser.set_defaults(reference_dir=None)
+    parser.set_defaults(sample_rate=16000)
+    parser.set_defaults(manifest=None)
+    parser.set_defaults(num_threads=16)
+    args = parser.parse_args()
+
+    main(args.corpus, args.corpus_dir, args.labels_dir, args.train_dir, args.decode_dir,
+        args.reference_dir, args.sample_rate, args.manifest, args.num_threads)
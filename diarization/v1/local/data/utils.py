@@ -7,6 +7,7 @@ Date: 2018
 Author: M. Sam Ribeiro
 """
 
+import struct
 import fileinput
 import subprocess
 
@@ -20,6 +21,64 @@ def write_data(data, filename):
 
 
 def get_duration(filename):
+    ''' get duration of waveform from its RIFF header,
+        or via ch_wave if the header cannot be parsed
+    '''
+    try:
+        return riff_duration(filename)
+    except (IOError, ValueError, struct.error):
+        return ch_wave_duration(filename)
+
+
+def float32(value):
+    ''' round value to single precision '''
+    return struct.unpack('<f', struct.pack('<f', value))[0]
+
+
+def riff_duration(filename):
+    ''' get duration of a PCM waveform from its RIFF header
+        gives the same value as ch_wave -info, which computes duration in
+        single precision and prints it with 4 decimal places
+        raises ValueError for anything other than 8 or 16 bit PCM with
+        a complete data chunk
+    '''
+    with open(filename, 'rb') as fid:
+        fid.seek(0, 2)
+        file_size = fid.tell()
+        fid.seek(0)
+
+        riff, _, wave = struct.unpack('<4sI4s', fid.read(12))
+        if riff != b'RIFF' or wave != b'WAVE':
+            raise ValueError('Not a RIFF/WAVE file: {0}'.format(filename))
+
+        # walk chunks, which may come in any order
+        fmt, data_size = None, None
+        while fid.tell() + 8 <= file_size:
+            chunk_id, chunk_size = struct.unpack('<4sI', fid.read(8))
+            if chunk_id == b'fmt ':
+                fmt = struct.unpack('<HHIIHH', fid.read(16))
+                chunk_size -= 16
+            elif chunk_id == b'data':
+                data_size = chunk_size
+                if fid.tell() + data_size > file_size:
+                    raise ValueError('Truncated data chunk: {0}'.format(filename))
+                break
+            # chunks are padded to an even number of bytes
+            fid.seek(chunk_size + chunk_size % 2, 1)
+
+    if fmt is None or data_size is None:
+        raise ValueError('Missing fmt or data chunk: {0}'.format(filename))
+
+    format_tag, channels, sample_rate, _, _, bits = fmt
+    if format_tag != 1 or bits not in (8, 16) or channels == 0 or sample_rate == 0:
+        raise ValueError('Unsupported waveform format: {0}'.format(filename))
+
+    num_samples = data_size // (channels * bits // 8)
+    duration = float32(float32(num_samples) / float32(sample_rate))
+    return float('{0:.4f}'.format(duration))
+
+
+def ch_wave_duration(filename):
     ''' get duration of waveform via Edinburgh Speech Tools's ch_wave '''
     cmd = 'ch_wave {0} -info'.format(filename)
     p = subprocess.Popen(cmd.split(), stdout=subprocess.PIPE)
@@ -44,3 +103,31 @@ def read_speaker_map(filename):
             speakers[subset] = [spkid]
 
     return speakers
+
+
+def read_frame_shift(filename=None):
+    ''' read frame shift in seconds from Kaldi feature config
+        defaults to Kaldi's 10 msecs if not set
+    '''
+    frame_shift = 10.0
+
+    if filename:
+        with open(filename) as fid:
+            for line in fid:
+                line = line.split('#')[0].strip()
+                if line.startswith('--frame-shift='):
+                    frame_shift = float(line.split('=')[1])
+
+    return frame_shift / 1000.
+
+
+def read_ultrasound_params(filename):
+    ''' read ultrasound parameters (.param) as a dictionary '''
+    params = {}
+    with open(filename) as param_id:
+        for line in param_id:
+            name, var = line.partition("=")[::2]
+            params[name.strip()] = float(var)
+
+    params['frame_size'] = int( params['NumVectors'] * params['PixPerVector'] )
+    return params
@@ -20,26 +20,28 @@
 # Stage 0: Prepare Kaldi data directories
 if [ $stage_start -le 0 ]; then
 
-    # prepare training data directories
-    python ./local/data/train-uxtd.py ${UXTD_CORE} ${LABEL_DIR}/uxtd \
-        ${DATA_DIR}/train --sr 16000  || exit 1
-
-    # prepare reference data directories for evaluation
-    python ./local/data/decode-uxtd.py ${UXTD_CORE} ${LABEL_DIR}/uxtd \
-        ${DATA_DIR}/decode/uxtd_reference --sr 16000 --use_reference  || exit 1
-    python ./local/data/decode-uxssd-upx.py ${UXSSD_CORE} ${LABEL_DIR}/uxssd\
-        ${DATA_DIR}/decode/uxssd_reference --sr 16000 --use_reference  || exit 1
+    # build or update corpus manifests, only new or modified files are probed
+    python ./local/data/manifest.py ${UXTD_CORE} ${MANIFEST_DIR}/uxtd.db || exit 1
+    python ./local/data/manifest.py ${UXSSD_CORE} ${MANIFEST_DIR}/uxssd.db || exit 1
+    python ./local/data/manifest.py ${UPX_CORE} ${MANIFEST_DIR}/upx.db || exit 1
+
+    # prepare training, reference and full decoding data directories,
+    # all directories for a corpus come from a single corpus walk
+    python ./local/data/prepare_data.py uxtd ${UXTD_CORE} ${LABEL_DIR}/uxtd \
+        --train ${DATA_DIR}/train \
+        --reference ${DATA_DIR}/decode/uxtd_reference \
+        --decode ${DATA_DIR}/decode/uxtd \
+        --sr 16000 --manifest ${MANIFEST_DIR}/uxtd.db || exit 1
+    python ./local/data/prepare_data.py uxssd ${UXSSD_CORE} ${LABEL_DIR}/uxssd \
+        --reference ${DATA_DIR}/decode/uxssd_reference \
+        --decode ${DATA_DIR}/decode/uxssd \
+        --sr 16000 --manifest ${MANIFEST_DIR}/uxssd.db || exit 1
+    python ./local/data/prepare_data.py upx ${UPX_CORE} ${LABEL_DIR}/upx \
+        --decode ${DATA_DIR}/decode/upx \
+        --sr 16000 --manifest ${MANIFEST_DIR}/upx.db || exit 1
+
     echo ${nj_ref} > ${DATA_DIR}/decode/uxtd_reference/nj
     echo ${nj_ref} > ${DATA_DIR}/decode/uxssd_reference/nj
-
-    # prepare full data directories for decoding
-    python ./local/data/decode-uxtd.py ${UXTD_CORE} ${LABEL_DIR}/uxtd \
-        ${DATA_DIR}/decode/uxtd --sr 16000 || exit 1
-    python ./local/data/decode-uxssd-upx.py ${UXSSD_CORE} ${LABEL_DIR}/uxssd \
-        ${DATA_DIR}/decode/uxssd --sr 16000 || exit 1
-    python ./local/data/decode-uxssd-upx.py ${UPX_CORE} ${LABEL_DIR}/upx \
-        ${DATA_DIR}/decode/upx --sr 16000  || exit 1
-
     echo ${nj_uxtd} > ${DATA_DIR}/decode/uxtd/nj
     echo ${nj_uxssd} > ${DATA_DIR}/decode/uxssd/nj
     echo ${nj_upx} > ${DATA_DIR}/decode/upx/nj
@@ -54,42 +56,16 @@ fi
 # Stage 1: Extract MFCC, F0, and ETA features
 if [ $stage_start -le 1 ]; then
 
-    #  make ETA, MFCC, F0 features and merge - training data
-    for subset in train; do
-        nj=${nj_train}
-
-        # Estimate Tongue Acticity (ETA)
-        python ./local/data/make_tongue_activity.py ${DATA_DIR}/train/${subset} \
-             ${DATA_DIR}/train/${subset}/data_tad --by-speaker --max-cores ${nj}
-
-        # MFCCs and F0
-        steps/make_mfcc_pitch.sh --nj $nj \
-            --mfcc-config ${mfcc_conf} --pitch-config ${pitch_conf} \
-            --paste_length_tolerance 2 \
-            ${DATA_DIR}/train/${subset} \
-            ${DATA_DIR}/train/${subset}/log \
-            ${DATA_DIR}/train/${subset}/data_mfccs || exit 1
-
-        # Merge and validate directory
-        python ./local/data/append_tongue_activity.py \
-            ${DATA_DIR}/train/${subset}/data_mfccs \
-            ${DATA_DIR}/train/${subset}/data_tad \
-            ${DATA_DIR}/train/${subset}/data  || exit 1
-
-        mv ${DATA_DIR}/train/${subset}/feats.scp ${DATA_DIR}/train/${subset}/feats.mfcc.scp
-        cat ${DATA_DIR}/train/${subset}/data/*.scp > ${DATA_DIR}/train/${subset}/feats.scp
-
-        steps/compute_cmvn_stats.sh ${DATA_DIR}/train/${subset} || exit 1
-        utils/fix_data_dir.sh ${DATA_DIR}/train/${subset}  || exit 1
-    done
-
-    # make ETA, MFCC, F0 features and merge - decoding data
-    for subset in uxtd_reference uxssd_reference uxtd uxssd upx; do
+    # make ETA, MFCC, F0 features and merge, once per utterance
+    # the full decoding sets act as a shared feature store for their subsets
+    for subset in uxtd uxssd upx; do
         nj=$(cat ${DATA_DIR}/decode/${subset}/nj)
 
         # Estimate Tongue Acticity (ETA)
         python ./local/data/make_tongue_activity.py ${DATA_DIR}/decode/${subset} \
-            ${DATA_DIR}/decode/${subset}/data_tad --by-speaker --max-cores ${nj}
+            ${DATA_DIR}/decode/${subset}/data_tad --by-speaker --max-cores ${nj} \
+            --cache-dir ${ETA_CACHE} --mfcc-config ${mfcc_conf} \
+            --manifest ${MANIFEST_DIR}/${subset}.db
 
         # MFCCs and F0
         steps/make_mfcc_pitch.sh --nj $nj \
@@ -100,7 +76,7 @@ if [ $stage_start -le 1 ]; then
             ${DATA_DIR}/decode/${subset}/data_mfccs || exit 1
 
         # Merge and validate directory
-        python ./local/data/append_tongue_activity.py \
+        python ./local/data/append_tongue_activity.py --mfcc-config ${mfcc_conf} --nj ${nj} \
             ${DATA_DIR}/decode/${subset}/data_mfccs \
             ${DATA_DIR}/decode/${subset}/data_tad  \
             ${DATA_DIR}/decode/${subset}/data || exit 1
@@ -112,6 +88,20 @@ if [ $stage_start -le 1 ]; then
         utils/fix_data_dir.sh ${DATA_DIR}/decode/${subset}
     done
 
+    # training and reference data are subsets of the full decoding sets:
+    # features are filtered from the store, CMVN stats are computed per subset
+    for subset_dir in train/train:uxtd decode/uxtd_reference:uxtd decode/uxssd_reference:uxssd; do
+        store=${DATA_DIR}/decode/${subset_dir#*:}
+        subset_dir=${DATA_DIR}/${subset_dir%:*}
+
+        for scp in feats.scp feats.mfcc.scp; do
+            utils/filter_scp.pl ${subset_dir}/utt2spk ${store}/${scp} > ${subset_dir}/${scp} || exit 1
+        done
+
+        steps/compute_cmvn_stats.sh ${subset_dir} || exit 1
+        utils/fix_data_dir.sh ${subset_dir} || exit 1
+    done
+
     if [ $stage_end -eq 1 ]; then
         exit 0
     fi
@@ -162,17 +152,25 @@ if [ $stage_start -le 4 ]; then
             --model ${EXP_DIR}/final.mdl --cmd "$decode_cmd" \
              ${EXP_DIR}/graph ${DATA_DIR}/decode/${subset}_reference ${EXP_DIR}/decode/${subset}_reference || exit 1
 
+        # tune LM weight and word insertion penalty against reference labels
+        # best setting is written to the decoding directory for Stage 5
+        ./local/align/sweep-lmwt.sh --cmd "$decode_cmd" \
+            --min-lmwt ${min_lmwt} --max-lmwt ${max_lmwt} --word-ins-penalty "${word_ins_penalty}" \
+            --nj-score ${nj} --cache-dir ${SCORE_CACHE} ./${EXP_DIR} ./${EXP_DIR}/decode/${subset}_reference \
+            ./${EXP_DIR}/graph ${LABEL_DIR}/${subset}/reference_labels/speaker_labels/lab || exit 1
+
         # convert decoder alignment to labels and TextGrids
         # requires Python's praatio to convert labs to TextGrids
-        ./local/align/decode-to-labs.sh ./${EXP_DIR} \
+        ./local/align/decode-to-labs.sh --cmd "$decode_cmd" ./${EXP_DIR} \
             ./${EXP_DIR}/decode/${subset}_reference ./${EXP_DIR}/graph ${DATA_DIR}/decode/${subset}_reference || exit 1
 
         # scores decoded labels against reference
         # requires Python's pyannote.metrics
-        python ./local/score/score-alignment.py \
+        python ./local/align/score-alignment.py \
             --ref ${LABEL_DIR}/${subset}/reference_labels/speaker_labels/lab \
             --hyp ${EXP_DIR}/decode/${subset}_reference/lab \
-            --out ${EXP_DIR}/decode/${subset}_reference/score # scores will be written to this directory!
+            --out ${EXP_DIR}/decode/${subset}_reference/score \
+            --nj ${nj} --cache-dir ${SCORE_CACHE} # scores will be written to this directory!
     done
 
     if [ $stage_end -eq 4 ]; then
@@ -196,9 +194,16 @@ if [ $stage_start -le 5 ]; then
              ${EXP_DIR}/graph ${DATA_DIR}/decode/${subset} \
              ${EXP_DIR}/decode/${subset} || exit 1
 
+        # use LM weight and word insertion penalty tuned in Stage 4
+        # upx has no reference labels and uses the uxssd setting
+        tuned=${EXP_DIR}/decode/${subset/upx/uxssd}_reference
+        for f in lmwt wip; do
+            [ -f ${tuned}/$f ] && cp ${tuned}/$f ${EXP_DIR}/decode/${subset}/$f
+        done
+
         # convert decoder alignment to labels and TextGrids
         # requires Python's praatio to convert labs to TextGrids
-        ./local/align/decode-to-labs.sh ./${EXP_DIR} \
+        ./local/align/decode-to-labs.sh --cmd "$decode_cmd" ./${EXP_DIR} \
             ./${EXP_DIR}/decode/${subset} ./${EXP_DIR}/graph ${DATA_DIR}/decode/${subset} || exit 1
     done
 